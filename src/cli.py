@@ -0,0 +1,263 @@
+""" **************************
+    ***        CLI.PY        ***
+    ************************** """
+# Este archivo contiene la interfaz de línea de comandos de SEITH para identificar especímenes
+# por lotes sin interfaz gráfica (no importa customtkinter ni groq).
+#
+# Uso:
+#   python -m src.cli identify --input especimenes.csv --output resultados.jsonl
+#   python -m src.cli bench    (micro-benchmark de latencia por consulta sobre la base actual)
+#   python -m src.cli import catalogo.csv   /   python -m src.cli export catalogo.json
+#
+# Entrada (CSV o JSONL, "-" para stdin):
+#   - id: identificador del espécimen (opcional, por defecto el número de fila)
+#   - traits: rasgos separados por "," o ";" (en JSONL también puede ser una lista)
+#   - image: ruta a una foto del espécimen (opcional); la forma y la superficie detectadas se suman a los rasgos
+# Salida (JSONL o CSV según la extensión, "-" para stdout): una línea por espécimen o por resultado.
+
+# --- Importaciones ---
+import argparse
+import csv
+import json
+import re
+import statistics
+import sys
+import time
+from contextlib import nullcontext
+from itertools import islice, product
+
+from src.models.database import db
+from src.models.expert_engine import ExpertEngine, ENGINES
+
+# --- Lectura de especímenes (streaming) ---
+def _split_traits(value):
+    """Convierte un texto o lista de rasgos en una lista limpia."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = re.split(r"[,;]", value)
+    return [str(t).strip() for t in value if str(t).strip()]
+
+def _open_input(path):
+    return nullcontext(sys.stdin) if path == "-" else open(path, newline="", encoding="utf-8")
+
+def _open_output(path):
+    return nullcontext(sys.stdout) if path == "-" else open(path, "w", newline="", encoding="utf-8")
+
+def _detect_format(path, forced):
+    if forced:
+        return forced
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+def read_specimens(stream, fmt, trait_columns):
+    """Genera los especímenes uno a uno, sin cargar el archivo completo en memoria."""
+    if fmt == "csv":
+        rows = csv.DictReader(stream)
+    else:
+        rows = (json.loads(line) for line in stream if line.strip())
+
+    for n, row in enumerate(rows, start=1):
+        traits = []
+        for column in trait_columns:
+            traits.extend(_split_traits(row.get(column)))
+        yield {
+            "id": row.get("id") or str(n),
+            "traits": traits,
+            "image": row.get("image") or ""
+        }
+
+# --- Escritura de resultados (streaming) ---
+class ResultWriter:
+    CSV_FIELDS = ["id", "rank", "species_id", "genus", "species", "common_name", "probability", "traits"]
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == "csv":
+            self.csv = csv.DictWriter(stream, fieldnames=self.CSV_FIELDS, extrasaction="ignore")
+            self.csv.writeheader()
+
+    def write(self, record):
+        if self.fmt == "jsonl":
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+        traits = ", ".join(record["traits"])
+        if not record["results"]:
+            self.csv.writerow({"id": record["id"], "traits": traits})
+        for rank, res in enumerate(record["results"], start=1):
+            row = {"rank": rank, "traits": traits, **res}
+            # "id" es siempre el del espécimen; el de la especie va en su propia columna
+            row["species_id"] = row.pop("id", "")
+            row["id"] = record["id"]
+            self.csv.writerow(row)
+
+# --- Comando identify ---
+def _analyze_image(specimen, overlay_dir=None):
+    """Añade los rasgos detectados por visión artificial (forma y superficie) a los del espécimen."""
+    # Importación diferida: OpenCV solo se carga si algún espécimen trae foto
+    from src.utils.image_helper import ImageHelper
+
+    analysis = ImageHelper.process_image(specimen["image"], overlay_dir=overlay_dir)
+    if analysis and analysis["status"] == "success":
+        specimen["traits"].extend(analysis["traits"])
+        keys = ("aspect_ratio", "detected_shape", "bbox", "morphometrics")
+        if overlay_dir:
+            keys += ("processed_image",)
+        return {k: analysis[k] for k in keys}
+    return {"status": analysis["status"] if analysis else "error"}
+
+def identify(args):
+    engine = ExpertEngine(args.engine)
+    fmt_in = _detect_format(args.input, args.input_format)
+    fmt_out = _detect_format(args.output, args.output_format)
+
+    count = 0
+    # Un solo pool de procesos para todo el archivo: arrancarlo en cada bloque cuesta más que identificarlo
+    pool = engine.batch_pool(args.workers) if args.workers > 1 else nullcontext()
+    with _open_input(args.input) as src, _open_output(args.output) as dst, pool as executor:
+        writer = ResultWriter(dst, fmt_out)
+        specimens = read_specimens(src, fmt_in, args.trait_columns.split(","))
+        # Se procesa por bloques para poder usar el pool de procesos sin cargar todo el archivo
+        while True:
+            chunk = list(islice(specimens, args.chunk_size))
+            if not chunk:
+                break
+
+            analyses = {}
+            for i, specimen in enumerate(chunk):
+                if specimen["image"]:
+                    analyses[i] = _analyze_image(specimen, args.overlay_dir)
+
+            batch = engine.identify_batch([s["traits"] for s in chunk], top_k=args.top_k,
+                                          workers=args.workers, executor=executor)
+            for i, (specimen, results) in enumerate(zip(chunk, batch)):
+                record = {"id": specimen["id"], "traits": specimen["traits"], "results": results}
+                if i in analyses:
+                    record["analysis"] = analyses[i]
+                writer.write(record)
+            count += len(chunk)
+
+    print(f"Especímenes procesados: {count}", file=sys.stderr)
+    return 0
+
+# --- Comando bench ---
+# Valores de los selectores del panel de categorización (UserPage)
+SELECTOR_VALUES = (
+    ("no observado", "ovalado", "subcilindrico", "redondeado"),
+    ("no observado", "liso", "rugoso", "estriado"),
+    ("no observado", "recto", "falcado"),
+    ("no observado", "pequeño", "mediano", "grande"),
+)
+
+def _legacy_identify(engine, traits):
+    """Inferencia anterior: recompila las reglas desde la base y recorre todas las especies."""
+    engine.load_rules_from_db()
+    return engine._identify(traits, "linear")
+
+def _legacy_enrich(results):
+    """Enriquecimiento anterior: relee todas las especies y reconstruye el mapa en cada consulta."""
+    species_map = {f"{s[1]} {s[2]}": s[6] for s in db.get_all_species()}
+    for res in results:
+        res["ref_image"] = species_map.get(f"{res['genus']} {res['species']}", "")
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+def _summary(samples):
+    p95 = statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+    return f"media {statistics.fmean(samples):8.3f} ms | p50 {statistics.median(samples):8.3f} ms | p95 {p95:8.3f} ms"
+
+def bench(args):
+    queries = [list(q) for q in product(*SELECTOR_VALUES)] * args.repeat
+    legacy = ExpertEngine("linear", cache_size=0)
+    engine = ExpertEngine(args.engine, cache_size=args.cache_size)
+    engine.ensure_rules()
+    print(f"Especies: {len(engine.rules)} | consultas: {len(queries)} | motor: {args.engine}")
+
+    timings = {"antes": ([], []), "después": ([], [])}
+    for traits in queries:
+        # Antes: recarga de reglas + bucle lineal + segunda consulta para las imágenes
+        results, t_infer = _timed(_legacy_identify, legacy, traits)
+        _, t_enrich = _timed(_legacy_enrich, results)
+        timings["antes"][0].append(t_infer)
+        timings["antes"][1].append(t_enrich)
+
+        # Después: reglas compiladas + motor elegido + enriquecimiento por id
+        results, t_infer = _timed(engine.identify_by_features, traits)
+        _, t_enrich = _timed(engine.attach_ref_images, results)
+        timings["después"][0].append(t_infer)
+        timings["después"][1].append(t_enrich)
+
+    for label, (infer, enrich) in timings.items():
+        print(f"[{label}]")
+        print(f"  inferencia      {_summary(infer)}")
+        print(f"  enriquecimiento {_summary(enrich)}")
+        print(f"  total           {_summary([a + b for a, b in zip(infer, enrich)])}")
+    info = engine.cache_info()
+    print(f"Caché de inferencias: {info.hits} aciertos, {info.misses} fallos, {info.currsize}/{info.maxsize} entradas")
+    return 0
+
+# --- Comandos import / export (base de conocimiento) ---
+def import_species(args):
+    from src.utils.species_io import import_catalogue
+
+    start = time.perf_counter()
+    report = import_catalogue(args.path, db, args.workers)
+    if report["status"] != "success":
+        print(f"Error: {report['message']}", file=sys.stderr)
+        return 1
+    for line in report["errors"] + report["warnings"]:
+        print(f"  {line}", file=sys.stderr)
+    print(f"Especies importadas: {report['inserted']} | omitidas: {report['skipped']} | "
+          f"rechazadas: {len(report['errors'])} | {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    return 0
+
+def export_species(args):
+    from src.utils.species_io import export_catalogue
+
+    count = export_catalogue(args.path, db)
+    print(f"Especies exportadas: {count}", file=sys.stderr)
+    return 0
+
+# --- Punto de entrada ---
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="SEITH - Identificación sin interfaz gráfica")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p_id = commands.add_parser("identify", help="Identifica especímenes desde un CSV o JSONL")
+    p_id.add_argument("--input", "-i", default="-", help="Archivo de entrada (.csv o .jsonl, '-' = stdin)")
+    p_id.add_argument("--output", "-o", default="-", help="Archivo de salida (.csv o .jsonl, '-' = stdout)")
+    p_id.add_argument("--input-format", choices=["csv", "jsonl"], help="Forzar formato de entrada")
+    p_id.add_argument("--output-format", choices=["csv", "jsonl"], help="Forzar formato de salida")
+    p_id.add_argument("--trait-columns", default="traits", help="Columnas con rasgos, separadas por coma")
+    p_id.add_argument("--top-k", type=int, default=5, help="Resultados por espécimen")
+    p_id.add_argument("--engine", choices=ENGINES, default="indexed", help="Backend de puntuación")
+    p_id.add_argument("--workers", type=int, default=1, help="Procesos para la inferencia")
+    p_id.add_argument("--chunk-size", type=int, default=500, help="Especímenes por bloque")
+    p_id.add_argument("--overlay-dir", help="Carpeta donde guardar la visualización de cada foto analizada")
+    p_id.set_defaults(func=identify)
+
+    p_bench = commands.add_parser("bench", help="Mide la latencia por consulta antes y después de las optimizaciones")
+    p_bench.add_argument("--engine", choices=ENGINES, default="indexed", help="Backend de puntuación a medir")
+    p_bench.add_argument("--repeat", type=int, default=3, help="Repeticiones de las combinaciones de selectores")
+    p_bench.add_argument("--cache-size", type=int, default=512, help="Tamaño de la caché de inferencias (0 = sin caché)")
+    p_bench.set_defaults(func=bench)
+
+    p_import = commands.add_parser("import", help="Importa un catálogo de especies (CSV, JSON o JSONL)")
+    p_import.add_argument("path", help="Archivo del catálogo; las rutas de imagen son relativas a él")
+    p_import.add_argument("--workers", type=int, help="Hilos para copiar las imágenes")
+    p_import.set_defaults(func=import_species)
+
+    p_export = commands.add_parser("export", help="Exporta la base de conocimiento (CSV, JSON o JSONL)")
+    p_export.add_argument("path", help="Archivo de salida (el formato sale de la extensión)")
+    p_export.set_defaults(func=export_species)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,12 +5,28 @@
 
 # --- Importaciones ---
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, CancelledError
 from PIL import Image
 from src.models.database import db
 from src.models.expert_engine import ExpertEngine
 from src.utils.image_helper import ImageHelper
 from src.utils.ai_assistant import AIAssistant
 
+# --- Constantes ---
+IDENTIFY_CHANNEL = "identificacion" # Canal compartido por la identificación por foto y por selectores
+IDENTIFY_WORKERS = 2 # Un análisis lento en curso no bloquea la petición que lo reemplaza
+AI_CHANNEL = "ia" # El chat y la explicación escriben en el mismo cuadro: comparten canal
+AI_WORKERS = 2 # Como mucho dos llamadas al LLM a la vez (la API limita las peticiones por minuto)
+
+def _call_now(fn, *args):
+    """Despachador por defecto: ejecuta el callback en el hilo que terminó el trabajo."""
+    fn(*args)
+
+def _check_cancelled(cancel):
+    if cancel is not None and cancel.is_set():
+        raise CancelledError()
+
 # --- Clase MainController ---
 class MainController:
     # --- Inicialización ---
@@ -19,6 +35,16 @@ class MainController:
         self.image_helper = ImageHelper
         self.ai = AIAssistant() # Inicializa el asistente
 
+        # Identificación asíncrona: una petición en curso por canal (la nueva cancela la anterior)
+        self._executor = ThreadPoolExecutor(max_workers=IDENTIFY_WORKERS, thread_name_prefix="seith-identify")
+        self._inflight = {} # canal -> (future, evento de cancelación)
+        self._inflight_lock = threading.Lock()
+
+        # Peticiones a la IA: pool acotado, una petición viva por canal y duplicados fusionados
+        self._ai_executor = ThreadPoolExecutor(max_workers=AI_WORKERS, thread_name_prefix="seith-ai")
+        self._ai_inflight = {} # canal -> {"key", "cancel", "future"}
+        self._ai_lock = threading.Lock()
+
     # --- Métodos de autenticación ---
     def login(self, username, password):
         user_info = db.authenticate(username, password)
@@ -34,29 +60,35 @@ class MainController:
 
     # --- Métodos de API Key ---
     def save_api_key(self, api_key):
-        """Guarda la API Key en el perfil del usuario actual."""
+        """Guarda la API Key en el perfil del usuario actual (solo si cambió)."""
         if hasattr(self, 'current_user'):
-            return db.save_user_api_key(self.current_user, api_key)
+            if api_key == getattr(self, 'user_api_key', None):
+                return True
+            saved = db.save_user_api_key(self.current_user, api_key)
+            if saved:
+                self.user_api_key = api_key
+            return saved
         return False
 
     # --- Lógica de Identificación (Usuario) ---
-    def identify_specimen(self, image_path):
-        """Orquesta el proceso de visión y motor experto."""
+    def identify_specimen(self, image_path, cancel=None):
+        """
+        Orquesta el proceso de visión y motor experto.
+        cancel (threading.Event opcional) se revisa entre etapas: si está activo se lanza CancelledError.
+        """
         # 1. Visión por Computadora (Asistencia)
         analysis = self.image_helper.process_image(image_path)
+        _check_cancelled(cancel)
         
         if analysis and analysis["status"] == "success":
-            detected_shape = analysis["detected_shape"]
+            # Rasgos morfométricos (forma y superficie); la forma sola si el análisis no los trae
+            traits = analysis.get("traits") or [analysis["detected_shape"]]
             # 2. Inferencia del Motor Experto (Buchanan)
-            results = self.engine.identify_by_features(detected_shape)
-            
-            # 3. Enriquecer resultados con rutas de imagen de la DB
-            all_species = db.get_all_species()
-            species_map = {f"{s[1]} {s[2]}": s[6] for s in all_species}
+            results = self.engine.identify_by_features(traits)
+            _check_cancelled(cancel)
             
-            for res in results:
-                key = f"{res['genus']} {res['species']}"
-                res["ref_image"] = species_map.get(key, "")
+            # 3. Enriquecer resultados con rutas de imagen (ya compiladas en el motor)
+            self.engine.attach_ref_images(results)
 
             return {
                 "status": "success",
@@ -71,19 +103,114 @@ class MainController:
         results = self.engine.identify_by_features(traits_list)
         
         # Enriquecer con imágenes de referencia
-        all_species = db.get_all_species()
-        species_map = {f"{s[1]} {s[2]}": s[6] for s in all_species}
-        for res in results:
-            key = f"{res['genus']} {res['species']}"
-            res["ref_image"] = species_map.get(key, "")
-            
-        return results
+        return self.engine.attach_ref_images(results)
+
+    # --- Identificación asíncrona (no bloquea el hilo de Tk) ---
+    def identify_specimen_async(self, image_path, on_done=None, dispatcher=None, channel=IDENTIFY_CHANNEL):
+        """
+        Versión asíncrona de identify_specimen. Devuelve un Future y cancela la petición anterior del canal.
+        on_done recibe el mismo diccionario que identify_specimen; dispatcher lleva la llamada al hilo
+        de la interfaz (p. ej. un TkDispatcher). Las peticiones reemplazadas nunca llaman a on_done.
+        """
+        return self._submit(channel, lambda cancel: self.identify_specimen(image_path, cancel), on_done, dispatcher)
+
+    def identify_by_manual_selection_async(self, traits_list, on_done=None, dispatcher=None, channel=IDENTIFY_CHANNEL):
+        """Versión asíncrona de identify_by_manual_selection; on_done recibe {"status", "results"}."""
+        def job(cancel):
+            _check_cancelled(cancel)
+            results = self.identify_by_manual_selection(traits_list)
+            _check_cancelled(cancel)
+            return {"status": "success", "results": results}
+        return self._submit(channel, job, on_done, dispatcher)
+
+    def cancel_identification(self, channel=IDENTIFY_CHANNEL):
+        """Cancela la petición en curso del canal (si la hay)."""
+        with self._inflight_lock:
+            previous = self._inflight.pop(channel, None)
+        if previous:
+            previous[0].cancel()
+            previous[1].set()
+
+    def _submit(self, channel, job, on_done, dispatcher):
+        cancel = threading.Event()
+        with self._inflight_lock:
+            previous = self._inflight.get(channel)
+            if previous:
+                # Si aún no empezó se descarta; si está corriendo se detiene en la siguiente etapa
+                previous[0].cancel()
+                previous[1].set()
+            future = self._executor.submit(self._run_job, job, cancel)
+            self._inflight[channel] = (future, cancel)
+
+        if on_done is not None:
+            future.add_done_callback(lambda f: self._deliver(channel, f, on_done, dispatcher or _call_now))
+        return future
+
+    @staticmethod
+    def _run_job(job, cancel):
+        try:
+            return job(cancel)
+        except CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error en la identificación: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def _is_current(self, channel, future):
+        with self._inflight_lock:
+            current = self._inflight.get(channel)
+        return current is not None and current[0] is future
+
+    def _deliver(self, channel, future, on_done, dispatcher):
+        if future.cancelled() or isinstance(future.exception(), CancelledError) or not self._is_current(channel, future):
+            return
+
+        def apply():
+            # Se vuelve a comprobar en el hilo de la interfaz: pudo llegar otra petición mientras tanto
+            if self._is_current(channel, future):
+                on_done(future.result())
+        dispatcher(apply)
+
+    def shutdown(self):
+        """Cancela las peticiones pendientes y libera los hilos de identificación."""
+        with self._inflight_lock:
+            pending = list(self._inflight.values())
+            self._inflight.clear()
+        for future, cancel in pending:
+            future.cancel()
+            cancel.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.cancel_ai()
+        self._ai_executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- Identificación por lotes (campañas de campo) ---
+    def identify_batch(self, trait_sets, workers=None):
+        """
+        Identifica muchos especímenes de una vez (una lista de rasgos por espécimen).
+        Las reglas (con sus imágenes) se cargan una sola vez; con workers > 1 la inferencia
+        se reparte en un pool de procesos. Los resultados respetan el orden de entrada.
+        """
+        batch_results = self.engine.identify_batch(trait_sets, workers=workers)
+        for results in batch_results:
+            self.engine.attach_ref_images(results)
+        return batch_results
+
+    def get_inference_cache_info(self):
+        """Aciertos y fallos de la caché de inferencias del motor."""
+        return self.engine.cache_info()
 
     # --- Gestión de Usuarios (Reestructuración) ---
     def get_all_users(self):
         """Recupera la lista de usuarios registrados."""
         return db.get_all_users()
 
+    def get_users_page(self, after_id=0, limit=100):
+        """Página de usuarios (id, username, role) a partir de after_id."""
+        return db.get_users_page(after_id, limit)
+
+    def count_users(self):
+        return db.count_users()
+
     def delete_user(self, username):
         """Elimina un usuario (seguridad)."""
         if username == "admin": return False
@@ -176,6 +303,20 @@ class MainController:
     def get_all_species(self):
         return db.get_all_species()
 
+    def get_species(self, species_id):
+        return db.get_species(species_id)
+
+    def get_species_page(self, after_id=0, limit=100):
+        """Página de especies (id, genus, species, common_name) a partir de after_id."""
+        return db.get_species_page(after_id, limit)
+
+    def count_species(self):
+        return db.count_species()
+
+    def search_species(self, text, limit=100):
+        """Búsqueda de texto completo en la base de conocimiento."""
+        return db.search_species(text, limit)
+
     # --- Administración de Especies ---
     def add_species(self, genus, species, common_name, description, features, image_path=None):
         saved_path = ""
@@ -189,6 +330,23 @@ class MainController:
                 
         return db.add_species(genus, species, common_name, description, features, saved_path)
 
+    # --- Importación y exportación masiva del catálogo ---
+    def import_species(self, path, workers=None):
+        """
+        Importa un catálogo CSV/JSON/JSONL en una sola transacción (ver species_io.import_catalogue).
+        El motor recompila sus reglas una única vez al final.
+        """
+        from src.utils.species_io import import_catalogue
+        report = import_catalogue(path, db, workers)
+        if report["status"] == "success":
+            self.engine.ensure_rules()
+        return report
+
+    def export_species(self, path):
+        """Exporta la base de conocimiento completa (CSV/JSON/JSONL según la extensión), en streaming."""
+        from src.utils.species_io import export_catalogue
+        return export_catalogue(path, db)
+
     # --- Métodos de actualización de especies ---
     def update_species(self, species_id, genus, species, common_name, description, features, image_path=None):
         saved_path = None
@@ -208,32 +366,113 @@ class MainController:
     # --- Lógica de IA Generativa ---
     def set_ai_api_key(self, api_key):
         """Permite configurar la llave de Gemini en tiempo de ejecución."""
+        # Misma llave: se conserva el asistente (y su conexión HTTP ya abierta)
+        if self.ai.client is not None and self.ai.api_key == api_key:
+            return True
         self.ai = AIAssistant(api_key=api_key)
         return True
 
     # --- Métodos de explicación de IA ---
+    def _explanation_args(self, result):
+        top = result[0]
+        # Creamos un resumen de rasgos para el prompt
+        features_desc = f"Forma caparazón Detectado: {top.get('probability')}% match."
+        return f"{top['genus']} {top['species']}", top['common_name'], features_desc
+
     def get_ai_explanation(self, result):
         """Obtiene una explicación científica sobre el resultado."""
         if not result or len(result) == 0:
             return "No hay resultados para explicar."
         
-        top = result[0]
-        # Creamos un resumen de rasgos para el prompt
-        features_desc = f"Forma caparazón Detectado: {top.get('probability')}% match."
-        
-        return self.ai.get_taxonomic_explanation(
-            f"{top['genus']} {top['species']}", 
-            top['common_name'], 
-            features_desc
-        )
+        return self.ai.get_taxonomic_explanation(*self._explanation_args(result))
+
+    def stream_ai_explanation(self, result):
+        """Como get_ai_explanation, pero genera la explicación por fragmentos a medida que llega."""
+        if not result or len(result) == 0:
+            yield "No hay resultados para explicar."
+            return
+
+        yield from self.ai.stream_taxonomic_explanation(*self._explanation_args(result))
 
     # --- Métodos de chat interactivo ---
-    def chat_with_ai(self, question, results):
-        """Conversación interactiva con contexto."""
+    def _chat_context(self, results):
         context = ""
         if results and len(results) > 0:
             top = results[0]
             context = f"El usuario está viendo un {top['genus']} {top['species']}."
-        
-        return self.ai.chat_query(question, context)
+        return context
+
+    def chat_with_ai(self, question, results):
+        """Conversación interactiva con contexto."""
+        return self.ai.chat_query(question, self._chat_context(results))
+
+    def stream_chat_with_ai(self, question, results):
+        """Conversación interactiva con contexto; la respuesta llega por fragmentos."""
+        yield from self.ai.stream_chat_query(question, self._chat_context(results))
+
+    # --- Peticiones asíncronas a la IA (pool acotado, fusión y reemplazo) ---
+    def explain_ai_async(self, results, on_chunk, on_done=None, dispatcher=None, channel=AI_CHANNEL):
+        """
+        Explicación en streaming en el pool de IA. Devuelve (future, nueva): si ya hay en curso una
+        petición idéntica en el canal no se lanza otra (nueva=False) y sus fragmentos no se repiten.
+        Una petición distinta reemplaza a la anterior, que se detiene sin entregar nada más.
+        """
+        key = ("explicacion",) + (self._explanation_args(results) if results else ())
+        return self._submit_ai(channel, key, lambda: self.stream_ai_explanation(results), on_chunk, on_done, dispatcher)
+
+    def ask_ai_async(self, question, results, on_chunk, on_done=None, dispatcher=None, channel=AI_CHANNEL):
+        """Pregunta al experto en streaming en el pool de IA (mismas reglas que explain_ai_async)."""
+        key = ("chat", question, self._chat_context(results))
+        return self._submit_ai(channel, key, lambda: self.stream_chat_with_ai(question, results), on_chunk, on_done, dispatcher)
+
+    def cancel_ai(self, channel=None):
+        """Detiene la petición de IA del canal (o de todos si channel es None)."""
+        with self._ai_lock:
+            channels = list(self._ai_inflight) if channel is None else [channel]
+            requests = [self._ai_inflight.pop(c) for c in channels if c in self._ai_inflight]
+        for request in requests:
+            request["cancel"].set()
+            request["future"].cancel()
+
+    def _submit_ai(self, channel, key, make_stream, on_chunk, on_done, dispatcher):
+        with self._ai_lock:
+            current = self._ai_inflight.get(channel)
+            if current and current["key"] == key and not current["future"].done():
+                # Doble clic o pregunta repetida: se reutiliza la petición en curso
+                return current["future"], False
+            if current:
+                current["cancel"].set()
+                current["future"].cancel()
+
+            request = {"key": key, "cancel": threading.Event()}
+            request["future"] = self._ai_executor.submit(
+                self._run_ai, channel, request, make_stream, on_chunk, on_done, dispatcher or _call_now
+            )
+            self._ai_inflight[channel] = request
+        return request["future"], True
+
+    def _ai_is_current(self, channel, request):
+        with self._ai_lock:
+            return self._ai_inflight.get(channel) is request and not request["cancel"].is_set()
+
+    def _deliver_ai(self, channel, request, callback, value):
+        # Ya en el hilo de la interfaz: lo de una petición reemplazada se descarta
+        if self._ai_is_current(channel, request):
+            callback(value)
+
+    def _run_ai(self, channel, request, make_stream, on_chunk, on_done, dispatcher):
+        parts = []
+        stream = make_stream()
+        try:
+            for chunk in stream:
+                if request["cancel"].is_set():
+                    raise CancelledError()
+                parts.append(chunk)
+                dispatcher(self._deliver_ai, channel, request, on_chunk, chunk)
+        finally:
+            stream.close() # Cierra también la respuesta HTTP si se cortó a medias
 
+        text = "".join(parts)
+        if on_done is not None:
+            dispatcher(self._deliver_ai, channel, request, on_done, text)
+        return text
@@ -7,71 +7,192 @@
 import sqlite3
 import os
 import hashlib
+import threading
+import weakref
+import atexit
+
+# Ajustes de rendimiento aplicados a cada conexión nueva.
+# WAL permite que varios hilos lean mientras otro escribe, sin bloqueos "database is locked".
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",   # Seguro con WAL y mucho más rápido que FULL
+    "PRAGMA cache_size=-16000",    # ~16 MB de caché de páginas
+    "PRAGMA mmap_size=134217728",  # 128 MB de lectura mapeada en memoria
+    "PRAGMA temp_store=MEMORY",
+)
+BUSY_TIMEOUT = 10 # Segundos de espera si otro escritor tiene el bloqueo
+
+# Conexión SQLite que admite referencias débiles, para poder cerrarlas todas al salir
+class _Connection(sqlite3.Connection):
+    pass
 
 # Clase Database
 class Database:
     def __init__(self, db_name="seith_data.db"):
         self.db_path = os.path.join(os.getcwd(), db_name)
+        # Una conexión persistente por hilo (los hilos de chat/IA y el hilo principal leen en paralelo)
+        self._local = threading.local()
+        self._connections = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
+        atexit.register(self.close)
+        # Versión de la base de conocimiento: aumenta con cada cambio en la tabla species
+        # para que el motor experto sepa cuándo recompilar sus reglas.
+        self.species_version = 0
         self.init_db()
 
     def _hash_password(self, password):
         """Genera un hash SHA-256 para la contraseña."""
         return hashlib.sha256(password.encode()).hexdigest()
 
+    def _mark_species_changed(self):
+        """Invalida las reglas compiladas del motor tras modificar la tabla species."""
+        self.species_version += 1
+
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """Devuelve la conexión persistente del hilo actual (la crea en el primer uso)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False solo para poder cerrarla desde close(); cada hilo usa la suya
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False, factory=_Connection)
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.add(conn)
+        return conn
 
-    def init_db(self):
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Tabla de Usuarios y Roles
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    role TEXT NOT NULL CHECK(role IN ('admin', 'user')),
-                    api_key TEXT -- Columna para persistir la llave de la IA
-                )
-            ''')
-            
-            # Intentar añadir la columna api_key si no existe (para migraciones)
+    def close(self):
+        """Cierra todas las conexiones abiertas (se llama automáticamente al salir)."""
+        with self._connections_lock:
+            connections = list(self._connections)
+            self._connections.clear()
+            # Un nuevo threading.local descarta las conexiones cerradas de todos los hilos
+            self._local = threading.local()
+        for conn in connections:
             try:
-                cursor.execute("ALTER TABLE users ADD COLUMN api_key TEXT")
-            except:
+                conn.close()
+            except sqlite3.Error:
                 pass
 
-            # Tabla de Especies (Base de Conocimientos)
-            # Aquí guardaremos los rasgos taxonómicos
+    # --- Migraciones del esquema ---
+    # Cada migración se aplica una sola vez; la última versión aplicada se guarda en schema_version.
+    # Para cambiar el esquema, añada una función nueva al final de MIGRATIONS (nunca edite las existentes).
+
+    def _migration_base_tables(self, cursor):
+        """v1: Tablas de usuarios y especies, con los usuarios por defecto."""
+        # Tabla de Usuarios y Roles
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL,
+                role TEXT NOT NULL CHECK(role IN ('admin', 'user'))
+            )
+        ''')
+
+        # Tabla de Especies (Base de Conocimientos)
+        # Aquí guardaremos los rasgos taxonómicos
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS species (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                genus TEXT NOT NULL,
+                species TEXT NOT NULL,
+                common_name TEXT,
+                description TEXT,
+                key_features TEXT, -- JSON o texto con rasgos
+                image_path TEXT
+            )
+        ''')
+
+        # Insertar administrador por defecto si no existe
+        cursor.execute("SELECT * FROM users WHERE username = 'admin'")
+        if not cursor.fetchone():
+            cursor.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                ("admin", self._hash_password("admin123"), "admin")
+            )
+        
+        # Insertar usuario por defecto si no existe
+        cursor.execute("SELECT * FROM users WHERE username = 'invitado'")
+        if not cursor.fetchone():
+            cursor.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                ("invitado", self._hash_password("user123"), "user")
+            )
+
+    def _migration_users_api_key(self, cursor):
+        """v2: Columna para persistir la llave de la IA (las bases antiguas ya pueden tenerla)."""
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(users)")]
+        if "api_key" not in columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN api_key TEXT")
+
+    def _migration_species_name_index(self, cursor):
+        """v3: Índice único por (genus, species) para búsquedas por nombre."""
+        try:
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_species_name ON species (genus, species)")
+        except sqlite3.IntegrityError:
+            # Bases antiguas con especies duplicadas: se indexa igual, sin la restricción de unicidad
+            print("Aviso: hay especies duplicadas (género y especie); se crea un índice no único.")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_species_name ON species (genus, species)")
+
+    def _migration_species_fts(self, cursor):
+        """v4: Índice de texto completo (FTS5) sobre nombres, descripción y rasgos."""
+        try:
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS species (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    genus TEXT NOT NULL,
-                    species TEXT NOT NULL,
-                    common_name TEXT,
-                    description TEXT,
-                    key_features TEXT, -- JSON o texto con rasgos
-                    image_path TEXT
-                )
+                CREATE VIRTUAL TABLE IF NOT EXISTS species_fts
+                USING fts5(genus, species, common_name, description, key_features,
+                           content='species', content_rowid='id')
             ''')
+        except sqlite3.OperationalError as e:
+            # SQLite compilado sin FTS5: search_species usará LIKE
+            print(f"Aviso: FTS5 no disponible ({e}); la búsqueda será secuencial.")
+            return
 
-            # Insertar administrador por defecto si no existe
-            cursor.execute("SELECT * FROM users WHERE username = 'admin'")
-            if not cursor.fetchone():
-                cursor.execute(
-                    "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                    ("admin", self._hash_password("admin123"), "admin")
-                )
-            
-            # Insertar usuario por defecto si no existe
-            cursor.execute("SELECT * FROM users WHERE username = 'invitado'")
-            if not cursor.fetchone():
-                cursor.execute(
-                    "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                    ("invitado", self._hash_password("user123"), "user")
-                )
-            
+        # Disparadores para mantener el índice sincronizado con la tabla species
+        triggers = (
+            '''CREATE TRIGGER IF NOT EXISTS species_fts_insert AFTER INSERT ON species BEGIN
+                INSERT INTO species_fts (rowid, genus, species, common_name, description, key_features)
+                VALUES (new.id, new.genus, new.species, new.common_name, new.description, new.key_features);
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS species_fts_delete AFTER DELETE ON species BEGIN
+                INSERT INTO species_fts (species_fts, rowid, genus, species, common_name, description, key_features)
+                VALUES ('delete', old.id, old.genus, old.species, old.common_name, old.description, old.key_features);
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS species_fts_update AFTER UPDATE ON species BEGIN
+                INSERT INTO species_fts (species_fts, rowid, genus, species, common_name, description, key_features)
+                VALUES ('delete', old.id, old.genus, old.species, old.common_name, old.description, old.key_features);
+                INSERT INTO species_fts (rowid, genus, species, common_name, description, key_features)
+                VALUES (new.id, new.genus, new.species, new.common_name, new.description, new.key_features);
+            END''',
+        )
+        for trigger in triggers:
+            cursor.execute(trigger)
+        cursor.execute("INSERT INTO species_fts (species_fts) VALUES ('rebuild')")
+
+    MIGRATIONS = (
+        _migration_base_tables,
+        _migration_users_api_key,
+        _migration_species_name_index,
+        _migration_species_fts,
+    )
+
+    def init_db(self):
+        """Aplica solo las migraciones pendientes (en un arranque normal es una única consulta)."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+            row = cursor.execute("SELECT version FROM schema_version").fetchone()
+            current = row[0] if row else 0
+            if current >= len(self.MIGRATIONS):
+                return
+
+            for migration in self.MIGRATIONS[current:]:
+                migration(self, cursor)
+
+            if row:
+                cursor.execute("UPDATE schema_version SET version = ?", (len(self.MIGRATIONS),))
+            else:
+                cursor.execute("INSERT INTO schema_version (version) VALUES (?)", (len(self.MIGRATIONS),))
             conn.commit()
 
     # --- Gestión de Usuarios ---
@@ -114,6 +235,22 @@ class Database:
             cursor.execute("SELECT id, username, role FROM users")
             return cursor.fetchall()
 
+    def get_users_page(self, after_id=0, limit=100):
+        """Paginación por clave de usuarios: hasta limit filas (id, username, role) con id > after_id."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, username, role FROM users WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)
+            )
+            return cursor.fetchall()
+
+    def count_users(self):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM users")
+            return cursor.fetchone()[0]
+
     def delete_user(self, username):
         """Elimina un usuario por su nombre de usuario."""
         try:
@@ -152,24 +289,126 @@ class Database:
                     VALUES (?, ?, ?, ?, ?, ?)
                 ''', (genus, species, common_name, description, features, image_path))
                 conn.commit()
-                return True
+            self._mark_species_changed()
+            return True
         except Exception as e:
             print(f"Error al añadir especie: {e}")
             return False
 
+    def add_species_bulk(self, rows):
+        """
+        Inserta muchas especies en una sola transacción. rows: tuplas
+        (genus, species, common_name, description, key_features, image_path).
+        Las que ya existen (mismo género y especie) se omiten. Devuelve cuántas se insertaron o None si falla.
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO species (genus, species, common_name, description, key_features, image_path)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+                inserted = cursor.rowcount # Suma de filas insertadas (sin contar las omitidas)
+                conn.commit()
+            self._mark_species_changed() # Una sola vez: el motor recompila sus reglas una sola vez
+            return inserted
+        except Exception as e:
+            print(f"Error en la importación masiva de especies: {e}")
+            return None
+
+    def iter_species(self, batch_size=500):
+        """Recorre todas las especies por bloques (para exportar sin cargarlas todas en memoria)."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM species ORDER BY id")
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    return
+                yield from batch
+
     def get_all_species(self):
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM species")
             return cursor.fetchall()
 
+    # --- Consultas con proyección (sin traer la descripción completa) ---
+
+    def get_species(self, species_id):
+        """Recupera una especie completa por su id (para el diálogo de edición)."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM species WHERE id = ?", (species_id,))
+            return cursor.fetchone()
+
+    def get_species_rules(self):
+        """Datos que necesita el motor experto: (id, genus, species, common_name, key_features, image_path)."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, genus, species, common_name, key_features, image_path FROM species ORDER BY id")
+            return cursor.fetchall()
+
+    def get_species_images(self):
+        """Devuelve (id, genus, species, image_path) de todas las especies."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, genus, species, image_path FROM species ORDER BY id")
+            return cursor.fetchall()
+
+    def get_species_page(self, after_id=0, limit=100):
+        """
+        Paginación por clave (keyset): devuelve hasta limit filas (id, genus, species, common_name)
+        con id > after_id. Para la página siguiente se pasa el id de la última fila recibida.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, genus, species, common_name FROM species WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)
+            )
+            return cursor.fetchall()
+
+    def count_species(self):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM species")
+            return cursor.fetchone()[0]
+
+    def search_species(self, text, limit=100):
+        """Búsqueda de texto completo en nombres, descripción y rasgos. Devuelve (id, genus, species, common_name)."""
+        terms = text.split()
+        if not terms:
+            return []
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # Cada palabra se cita (evita la sintaxis de FTS5) y se busca por prefijo
+                match = " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+                cursor.execute('''
+                    SELECT s.id, s.genus, s.species, s.common_name
+                    FROM species_fts JOIN species s ON s.id = species_fts.rowid
+                    WHERE species_fts MATCH ? ORDER BY rank LIMIT ?
+                ''', (match, limit))
+            except sqlite3.OperationalError:
+                # Sin FTS5: búsqueda secuencial
+                pattern = f"%{text.strip()}%"
+                cursor.execute('''
+                    SELECT id, genus, species, common_name FROM species
+                    WHERE genus || ' ' || species LIKE ? OR common_name LIKE ?
+                       OR description LIKE ? OR key_features LIKE ?
+                    ORDER BY id LIMIT ?
+                ''', (pattern, pattern, pattern, pattern, limit))
+            return cursor.fetchall()
+
     def delete_species(self, species_id):
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM species WHERE id = ?", (species_id,))
                 conn.commit()
-                return True
+            self._mark_species_changed()
+            return True
         except Exception as e:
             print(f"Error al eliminar especie: {e}")
             return False
@@ -191,10 +430,30 @@ class Database:
                         WHERE id = ?
                     ''', (genus, species, common_name, description, features, species_id))
                 conn.commit()
-                return True
+            self._mark_species_changed()
+            return True
         except Exception as e:
             print(f"Error al actualizar especie: {e}")
             return False
 
+# --- Instancia global (perezosa) ---
+# La base de datos no se abre al importar el módulo, sino en el primer uso real.
+_db_instance = None
+_db_lock = threading.Lock()
+
+def get_db():
+    """Devuelve la instancia global de Database, creándola en el primer uso."""
+    global _db_instance
+    if _db_instance is None:
+        with _db_lock:
+            if _db_instance is None:
+                _db_instance = Database()
+    return _db_instance
+
+class _LazyDatabase:
+    """Intermediario que delega en get_db(): permite seguir usando "from ... import db"."""
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
 # Instancia global para ser usada por los controladores
-db = Database()
+db = _LazyDatabase()
@@ -5,65 +5,119 @@
 
 # --- Importaciones ---
 from src.models.database import db
+from src.models.feature_index import FeatureIndex
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 import json
+import threading
+
+# --- Conocimiento de ponderación ---
+# Sinónimos aceptados para cada rasgo (coincidencia por tesauro)
+THESAURUS = {
+    "subcilindrico": ["ovalado", "cilindrico", "alargado"],
+    "ovalado": ["subcilindrico", "redondeado", "elipsoide"],
+    "liso": ["suave", "sin rugosidad"],
+    "rugoso": ["granulado", "estriado", "asperos", "rugosa"]
+}
+HEAVY_TRAITS = ["rugoso", "falcado", "estriado"] # Rasgos con mayor peso taxonómico
+HEAVY_WEIGHT = 1.5
+THESAURUS_FACTOR = 0.7
+
+ENGINES = ("linear", "indexed", "vectorized") # Backends de puntuación disponibles
+
+def trait_weight(u_feat):
+    """Peso taxonómico de un rasgo observado."""
+    return HEAVY_WEIGHT if any(k in u_feat for k in HEAVY_TRAITS) else 1.0
 
 # --- Clase principal ---
 class ExpertEngine:
     # Inicializa el motor de inferencia
-    def __init__(self):
+    def __init__(self, engine="indexed", cache_size=512):
+        if engine not in ENGINES:
+            raise ValueError(f"Motor desconocido: {engine}. Opciones: {', '.join(ENGINES)}")
+        self.engine = engine
         self.rules = []
+        self.rules_by_id = {}
+        self.index = FeatureIndex([])
+        self.vector_scorer = None # Matriz NumPy, se construye al primer uso del motor "vectorized"
+        self.kb_version = None # Versión de la base con la que se compilaron las reglas
+        # Serializa las recompilaciones: la interfaz identifica desde varios hilos a la vez
+        self._rules_lock = threading.RLock()
+        # Caché LRU de inferencias: los selectores solo admiten unos cientos de combinaciones
+        self._cached_identify = lru_cache(maxsize=cache_size)(self._identify_canonical)
 
     # Carga las reglas (especies) desde la base de datos
     def load_rules_from_db(self):
-        """Carga las reglas (especies) desde la base de datos."""
-        species_data = db.get_all_species()
-        self.rules = []
+        """Carga y compila las reglas (especies) desde la base de datos."""
+        with self._rules_lock:
+            # Se toma la versión antes de leer: si alguien escribe durante la carga, la próxima consulta recompila
+            version = db.species_version
+            self._compile(self._read_rules(), version)
+
+    # Lee y normaliza las reglas sin tocar el estado del motor
+    def _read_rules(self):
+        species_data = db.get_species_rules() # Sin la descripción: el motor no la usa
+        rules = []
         for s in species_data:
             # Intentamos parsear los rasgos como JSON, si falla los tratamos como texto
             try:
-                features = json.loads(s[5])
+                features = json.loads(s[4])
             except:
                 # Si es texto plano, lo convertimos en una lista de palabras clave
-                features = s[5].lower().replace(",", " ").split()
+                features = (s[4] or "").lower().replace(",", " ").split()
             
-            self.rules.append({
+            rules.append({
+                "id": s[0],
                 "genus": s[1],
                 "species": s[2],
                 "common_name": s[3],
-                "features": features
+                # Rasgos ya normalizados: se compilan una sola vez y no en cada consulta
+                "features": [str(f).strip().lower() for f in features],
+                "image_path": s[5] or ""
             })
+        return rules
 
-    # Identifica las especies por rasgos
-    def identify_by_features(self, user_features):
-        """
-        Motor de inferencia con Ponderación de Rasgos (Calidad sobre Cantidad).
-        user_features puede ser una lista de rasgos seleccionados.
-        """
-        self.load_rules_from_db()
-        results = []
-        
-        thesaurus = {
-            "subcilindrico": ["ovalado", "cilindrico", "alargado"],
-            "ovalado": ["subcilindrico", "redondeado", "elipsoide"],
-            "liso": ["suave", "sin rugosidad"],
-            "rugoso": ["granulado", "estriado", "asperos", "rugosa"]
-        }
+    # Construye las estructuras de búsqueda a partir de reglas ya normalizadas
+    def _compile(self, rules, version=None):
+        # Todo se construye en variables locales y se publica de una vez: una consulta en curso
+        # sigue usando el conjunto anterior completo, nunca una mezcla de los dos
+        rules_by_id = {rule["id"]: rule for rule in rules}
+        index = FeatureIndex(rules)
+        with self._rules_lock:
+            self.rules, self.rules_by_id, self.index = rules, rules_by_id, index
+            self.vector_scorer = None
+            self.kb_version = version
+            self._cached_identify.cache_clear() # Los resultados de la versión anterior ya no sirven
 
-        # Asegurar que user_features sea una lista limpia
+    # Recompila las reglas solo si la base de conocimiento cambió
+    def ensure_rules(self):
+        """Garantiza que las reglas compiladas correspondan a la versión actual de la base."""
+        if self.kb_version != db.species_version:
+            with self._rules_lock:
+                # Otro hilo pudo recompilar mientras se esperaba el cerrojo
+                if self.kb_version != db.species_version:
+                    self.load_rules_from_db()
+        return self.rules
+
+    # Normaliza los rasgos de entrada del usuario
+    def _normalize_user_features(self, user_features):
+        """Convierte la entrada (texto o lista) en una lista limpia de rasgos."""
         if isinstance(user_features, str):
-            user_features = [f.strip().lower() for f in user_features.replace(",", " ").split() if f.strip()]
-        else:
-            user_features = [f.lower() for f in user_features if f.lower() != "no observado"]
-        
-        if not user_features: return []
+            return [f.strip().lower() for f in user_features.replace(",", " ").split() if f.strip()]
+        return [f.lower() for f in user_features if f.lower() != "no observado"]
 
-        for rule in self.rules:
+    # Puntuación de referencia: recorre todas las reglas (O(especies x rasgos))
+    def _score_linear(self, user_features):
+        """Puntúa cada regla comparando rasgo a rasgo. Devuelve {índice de regla: puntaje}."""
+        scores = {}
+        for idx, rule in enumerate(self.rules):
             score = 0
-            rule_features = [f.strip().lower() for f in rule["features"]]
+            rule_features = rule["features"]
             
             for u_feat in user_features:
                 # Rasgos con Mayor Peso Taxonómico
-                weight = 1.5 if any(k in u_feat for k in ["rugoso", "falcado", "estriado"]) else 1.0
+                weight = trait_weight(u_feat)
                 
                 # Coincidencia Directa
                 found = False
@@ -79,26 +133,191 @@ class ExpertEngine:
                             break
                 
                 # Coincidencia por Tesauro
-                if not found and u_feat in thesaurus:
-                    for syn in thesaurus[u_feat]:
+                if not found and u_feat in THESAURUS:
+                    for syn in THESAURUS[u_feat]:
                         if any(syn in r_f for r_f in rule_features):
-                            score += (weight * 0.7)
+                            score += (weight * THESAURUS_FACTOR)
                             found = True
                             break
             
             if score > 0:
-                # Probabilidad basada en la cantidad de rasgos coincidentes sobre los buscados
-                probability = (score / len(user_features)) * 100
-                probability = min(probability, 100) # Cap at 100%
-
-                results.append({
-                    "genus": rule["genus"],
-                    "species": rule["species"],
-                    "common_name": rule["common_name"],
-                    "probability": round(probability, 2)
-                })
-        
-        return sorted(results, key=lambda x: x["probability"], reverse=True)
-
-# Instancia global
-engine = ExpertEngine()
+                scores[idx] = score
+        return scores
+
+    # Puntuación con índice invertido: solo se visitan las especies candidatas
+    def _score_indexed(self, user_features):
+        """Mismo puntaje que _score_linear, pero consultando el índice de rasgos."""
+        scores = {}
+        for u_feat in user_features:
+            weight = trait_weight(u_feat)
+
+            # Coincidencia Directa o Parcial
+            direct = self.index.match(u_feat)
+            for idx in direct:
+                scores[idx] = scores.get(idx, 0) + weight
+
+            # Coincidencia por Tesauro (solo donde no hubo coincidencia directa)
+            if u_feat in THESAURUS:
+                synonyms = set()
+                for syn in THESAURUS[u_feat]:
+                    synonyms |= self.index.containing(syn)
+                for idx in synonyms - direct:
+                    scores[idx] = scores.get(idx, 0) + (weight * THESAURUS_FACTOR)
+        return scores
+
+    # Puntuación vectorizada: producto matriz dispersa x vector con NumPy
+    def _score_vectorized(self, user_features):
+        """Mismo puntaje que _score_linear, calculado sobre la matriz especie x rasgo."""
+        return self._get_vector_scorer().score(user_features, THESAURUS, trait_weight, THESAURUS_FACTOR)
+
+    # Matriz especie x rasgo del motor "vectorized" (se construye al primer uso)
+    def _get_vector_scorer(self):
+        scorer = self.vector_scorer
+        if scorer is None:
+            # Importación diferida: NumPy solo se carga si se usa este motor
+            from src.models.vector_scorer import VectorScorer
+            with self._rules_lock:
+                if self.vector_scorer is None:
+                    self.vector_scorer = VectorScorer(self.rules, self.index)
+                scorer = self.vector_scorer
+        return scorer
+
+    # Ordena los puntajes de los motores por reglas
+    def _rank(self, scores, n_features, top_k=None):
+        """Devuelve [(índice de regla, probabilidad)] ordenado de mayor a menor probabilidad."""
+        ranked = []
+        # Se respeta el orden de las reglas para que los empates queden igual que antes
+        for idx in sorted(scores):
+            # Probabilidad basada en la cantidad de rasgos coincidentes sobre los buscados
+            probability = (scores[idx] / n_features) * 100
+            probability = min(probability, 100) # Cap at 100%
+            ranked.append((idx, round(probability, 2)))
+
+        ranked.sort(key=lambda x: x[1], reverse=True)
+        return ranked if top_k is None else ranked[:top_k]
+
+    # Identifica las especies por rasgos
+    def identify_by_features(self, user_features, engine=None, top_k=None):
+        """
+        Motor de inferencia con Ponderación de Rasgos (Calidad sobre Cantidad).
+        user_features puede ser una lista de rasgos seleccionados.
+        engine permite elegir el backend ("linear", "indexed" o "vectorized") para esta consulta
+        y top_k limita la cantidad de resultados devueltos.
+        """
+        self.ensure_rules()
+        return self._identify_cached(user_features, engine or self.engine, top_k)
+
+    # --- Caché de inferencias ---
+    def canonical_traits(self, user_features):
+        """Clave canónica de un conjunto de rasgos: ordenados, en minúsculas y sin "no observado"."""
+        return tuple(sorted(self._normalize_user_features(user_features)))
+
+    def _identify_canonical(self, traits, engine, top_k, kb_version):
+        # kb_version solo forma parte de la clave: un cambio en la base nunca reutiliza resultados viejos.
+        # Bajo el cerrojo: una recompilación no puede cambiar las reglas a mitad de la consulta
+        with self._rules_lock:
+            return tuple(self._identify(list(traits), engine, top_k))
+
+    def _identify_cached(self, user_features, engine, top_k=None):
+        results = self._cached_identify(self.canonical_traits(user_features), engine, top_k, self.kb_version)
+        # Copias: quien llama puede enriquecer los resultados sin alterar la caché
+        return [dict(res) for res in results]
+
+    def cache_info(self):
+        """Contadores de la caché de inferencias desde la última recompilación (hits, misses, maxsize, currsize)."""
+        return self._cached_identify.cache_info()
+
+    # Inferencia sobre las reglas ya compiladas (sin consultar la base de datos)
+    def _identify(self, user_features, engine, top_k=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Motor desconocido: {engine}. Opciones: {', '.join(ENGINES)}")
+
+        # Asegurar que user_features sea una lista limpia
+        user_features = self._normalize_user_features(user_features)
+        if not user_features: return []
+
+        if engine == "vectorized":
+            scores = self._score_vectorized(user_features)
+            ranked = self._get_vector_scorer().rank(scores, len(user_features), top_k)
+        else:
+            score_fn = self._score_linear if engine == "linear" else self._score_indexed
+            ranked = self._rank(score_fn(user_features), len(user_features), top_k)
+
+        results = []
+        for idx, probability in ranked:
+            rule = self.rules[idx]
+            results.append({
+                "id": rule["id"],
+                "genus": rule["genus"],
+                "species": rule["species"],
+                "common_name": rule["common_name"],
+                "probability": probability
+            })
+        return results
+
+    # Añade la imagen de referencia a los resultados (sin volver a consultar la base)
+    def attach_ref_images(self, results):
+        """Completa "ref_image" en cada resultado a partir de las reglas compiladas."""
+        for res in results:
+            rule = self.rules_by_id.get(res["id"])
+            res["ref_image"] = rule["image_path"] if rule else ""
+        return results
+
+    # Identifica muchos especímenes de una sola vez
+    def identify_batch(self, trait_sets, engine=None, top_k=None, workers=None, executor=None):
+        """
+        Identifica una lista de conjuntos de rasgos (uno por espécimen) compilando las reglas una sola vez.
+        Con workers > 1 reparte los especímenes en un pool de procesos; executor permite reutilizar
+        un pool creado con batch_pool() en varias llamadas (por ejemplo, un bloque tras otro).
+        Devuelve las listas de resultados en el mismo orden de entrada.
+        """
+        engine = engine or self.engine
+        self.ensure_rules()
+
+        if executor is None and (not workers or workers <= 1):
+            return [self._identify_cached(traits, engine, top_k) for traits in trait_sets]
+
+        trait_sets = list(trait_sets)
+        chunksize = max(1, len(trait_sets) // ((workers or 1) * 4))
+        if executor is not None:
+            return list(executor.map(_identify_in_worker, trait_sets, repeat(engine), repeat(top_k), chunksize=chunksize))
+        with self.batch_pool(workers) as pool:
+            return list(pool.map(_identify_in_worker, trait_sets, repeat(engine), repeat(top_k), chunksize=chunksize))
+
+    # Pool de procesos con las reglas ya compiladas
+    def batch_pool(self, workers):
+        """
+        Crea un pool de procesos que recibe las reglas actuales una sola vez, al arrancar cada proceso.
+        El pool conserva esas reglas: si la base cambia, hay que crear uno nuevo.
+        """
+        self.ensure_rules()
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker, initargs=(self.rules,))
+
+# --- Pool de procesos para identify_batch ---
+# Cada proceso recibe las reglas ya compiladas: no vuelve a leer la base de datos.
+_worker_state = {}
+
+def _init_batch_worker(rules):
+    worker_engine = ExpertEngine()
+    worker_engine._compile(rules)
+    _worker_state["engine"] = worker_engine
+
+def _identify_in_worker(traits, engine, top_k):
+    # También con caché: en un lote grande se repiten muchas combinaciones de rasgos
+    return _worker_state["engine"]._identify_cached(traits, engine, top_k)
+
+# --- Instancia global (perezosa) ---
+_engine_instance = None
+
+def get_engine():
+    """Devuelve el motor global, creándolo en el primer uso."""
+    global _engine_instance
+    if _engine_instance is None:
+        _engine_instance = ExpertEngine()
+    return _engine_instance
+
+def __getattr__(name):
+    # "from src.models.expert_engine import engine" sigue funcionando, pero el motor se crea al pedirlo
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
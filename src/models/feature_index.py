@@ -0,0 +1,73 @@
+""" **************************
+    ***    FEATURE INDEX     ***
+    ************************** """
+# Este archivo contiene la clase FeatureIndex: un índice invertido de rasgos taxonómicos
+# que permite al motor experto puntuar solo las especies candidatas.
+
+# --- Constantes ---
+NGRAM_SIZE = 3 # Tamaño de los n-gramas usados para las búsquedas por subcadena
+
+# --- Funciones auxiliares ---
+def _ngrams(text, n=NGRAM_SIZE):
+    """Devuelve el conjunto de n-gramas de un texto."""
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+# --- Clase principal ---
+class FeatureIndex:
+    """
+    Índice invertido sobre los rasgos normalizados de las reglas.
+    Reproduce exactamente las coincidencias por subcadena del motor
+    (u_feat in r_feat or r_feat in u_feat) sin recorrer todas las especies.
+    """
+    def __init__(self, rules):
+        self.postings = {} # rasgo normalizado -> conjunto de índices de regla
+        self.grams = {}    # n-grama -> conjunto de rasgos que lo contienen
+
+        for idx, rule in enumerate(rules):
+            for feat in rule["features"]:
+                self.postings.setdefault(feat, set()).add(idx)
+
+        for feat in self.postings:
+            for gram in _ngrams(feat):
+                self.grams.setdefault(gram, set()).add(feat)
+
+    def _union(self, feats):
+        result = set()
+        for feat in feats:
+            result |= self.postings[feat]
+        return result
+
+    # Rasgos del vocabulario que contienen al término (term in r_feat)
+    def containing_features(self, term):
+        """Rasgos del vocabulario que contienen a term."""
+        if len(term) < NGRAM_SIZE:
+            # Términos muy cortos: basta con recorrer el vocabulario (no las especies)
+            candidates = self.postings
+        else:
+            candidates = None
+            for gram in _ngrams(term):
+                feats = self.grams.get(gram)
+                if not feats:
+                    return []
+                candidates = feats if candidates is None else candidates & feats
+        return [f for f in candidates if term in f]
+
+    # Rasgos del vocabulario contenidos en el término (r_feat in term)
+    def contained_features(self, term):
+        """Rasgos del vocabulario que son subcadena de term."""
+        substrings = {term[i:j] for i in range(len(term)) for j in range(i + 1, len(term) + 1)}
+        substrings.add("")
+        return [s for s in substrings if s in self.postings]
+
+    # Coincidencia directa o parcial, equivalente a la del motor original
+    def match_features(self, term):
+        """Rasgos del vocabulario que coinciden directa o parcialmente con term."""
+        return set(self.containing_features(term)) | set(self.contained_features(term))
+
+    def containing(self, term):
+        """Índices de las reglas con algún rasgo que contiene a term."""
+        return self._union(self.containing_features(term))
+
+    def match(self, term):
+        """Índices de las reglas que coinciden directa o parcialmente con term."""
+        return self._union(self.match_features(term))
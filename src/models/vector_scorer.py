@@ -0,0 +1,69 @@
+""" **************************
+    ***    VECTOR SCORER     ***
+    ************************** """
+# Este archivo contiene la clase VectorScorer: un backend de puntuación con NumPy que codifica
+# la base de conocimiento como una matriz dispersa especie x rasgo.
+
+# --- Importaciones ---
+import numpy as np
+
+# --- Clase principal ---
+class VectorScorer:
+    """
+    Matriz dispersa (formato COO) de incidencia especie x rasgo del vocabulario.
+    Cada consulta se reduce a productos matriz-vector con np.bincount y a una selección top-k.
+    """
+    def __init__(self, rules, index):
+        self.index = index
+        self.n_species = len(rules)
+        self.columns = {feat: col for col, feat in enumerate(index.postings)}
+
+        rows, cols = [], []
+        for feat, rule_ids in index.postings.items():
+            rows.extend(rule_ids)
+            cols.extend([self.columns[feat]] * len(rule_ids))
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+
+    # Producto matriz dispersa x vector de rasgos consultados
+    def _hits(self, feats):
+        """Máscara booleana de las especies que tienen alguno de los rasgos dados."""
+        query = np.zeros(len(self.columns))
+        query[[self.columns[f] for f in feats]] = 1.0
+        return np.bincount(self.rows, weights=query[self.cols], minlength=self.n_species) > 0
+
+    def score(self, user_features, thesaurus, weight_fn, thesaurus_factor):
+        """Vector de puntajes por especie, idéntico al del motor por reglas."""
+        scores = np.zeros(self.n_species)
+        for u_feat in user_features:
+            weight = weight_fn(u_feat)
+
+            # Coincidencia Directa o Parcial
+            direct = self._hits(self.index.match_features(u_feat))
+            scores += weight * direct
+
+            # Coincidencia por Tesauro (solo donde no hubo coincidencia directa)
+            if u_feat in thesaurus:
+                synonyms = set()
+                for syn in thesaurus[u_feat]:
+                    synonyms.update(self.index.containing_features(syn))
+                scores += (weight * thesaurus_factor) * (self._hits(synonyms) & ~direct)
+        return scores
+
+    def rank(self, scores, n_features, top_k=None):
+        """Devuelve [(índice de regla, probabilidad)] ordenado como el motor original."""
+        candidates = np.flatnonzero(scores > 0)
+        raw = (scores[candidates] / n_features) * 100
+        # round() de Python para que los empates coincidan con el motor por reglas
+        probs = np.array([round(min(p, 100), 2) for p in raw.tolist()])
+
+        if top_k is not None and 0 < top_k < len(candidates):
+            # Selección parcial: solo se ordenan las candidatas que pueden entrar en el top-k
+            threshold = np.partition(-probs, top_k - 1)[top_k - 1]
+            keep = -probs <= threshold
+            candidates, probs = candidates[keep], probs[keep]
+
+        order = np.lexsort((candidates, -probs))
+        if top_k is not None:
+            order = order[:top_k]
+        return [(int(candidates[i]), probs[i].item()) for i in order]
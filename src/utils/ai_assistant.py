@@ -3,28 +3,142 @@
     ************************** """
 # Este archivo es el asistente de IA que se encarga de responder las preguntas de los usuarios.
 # --- Importaciones ---
-from groq import Groq
+from groq import Groq, RateLimitError
+import atexit
+import hashlib
+import httpx
+import json
 import os
+import random
+import threading
+import time
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from itertools import chain
+from src.utils.sqlite_cache import SQLiteCache
+
+# --- Constantes ---
+PRIMARY_MODEL = "llama-3.3-70b-versatile"
+FALLBACK_MODEL = "mixtral-8x7b-32768"
+RESPONSE_CACHE_MAX_BYTES = 8 * 1024 * 1024
+RESPONSE_CACHE_TTL = 30 * 24 * 3600 # Las explicaciones se renuevan cada 30 días
+REQUEST_TIMEOUT = 30.0 # Segundos máximos por petición (sin timeout una petición colgada bloquea para siempre)
+MAX_RETRIES = 3 # Reintentos ante límite de tasa (429)
+BACKOFF_BASE = 0.5 # Espera base (s) del backoff exponencial
+BACKOFF_MAX = 8.0
+HEDGE_AFTER = 6.0 # Si el modelo principal tarda más, se lanza en paralelo el alternativo (None = desactivado)
+_response_cache = None
+
+def _get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = SQLiteCache("ai_responses", max_bytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL)
+    return _response_cache
+
+def prompt_key(messages, model, **params):
+    """Clave de caché: hash del prompt completo (mensajes y parámetros) más el nombre del modelo."""
+    payload = json.dumps({"messages": messages, "params": params}, ensure_ascii=False, sort_keys=True)
+    return f"{model}:{hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()}"
+
+# --- Clientes de Groq reutilizables ---
+# Una sola sesión HTTP con keep-alive para todo el proceso y un cliente Groq por API Key:
+# las preguntas siguientes reutilizan la conexión TLS ya abierta.
+KEEPALIVE_SECONDS = 300 # httpx cierra por defecto las conexiones inactivas a los 5 s
+_http_client = None
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _get_http_client():
+    global _http_client
+    if _http_client is None:
+        # Cliente httpx propio (el SDK lo acepta en http_client); el timeout se fija en cada petición
+        _http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=KEEPALIVE_SECONDS),
+            follow_redirects=True
+        )
+        atexit.register(_http_client.close)
+    return _http_client
+
+def get_client(api_key):
+    """Cliente Groq en caché por API Key (todos comparten la sesión HTTP)."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            # Los reintentos los gestiona AIAssistant (backoff con jitter), no el SDK
+            client = Groq(api_key=api_key, http_client=_get_http_client(), max_retries=0)
+            _clients[api_key] = client
+        return client
+
+# --- Reintentos y peticiones en paralelo ---
+def _run_detached(fn, *args, **kwargs):
+    """
+    Ejecuta fn en un hilo daemon y devuelve un Future. No se usa un pool: la petición que pierde
+    la carrera no se puede cancelar y no debe retrasar el cierre de la aplicación.
+    """
+    future = Future()
+
+    def target():
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, daemon=True, name="seith-llm").start()
+    return future
+
+def _is_rate_limited(error):
+    return isinstance(error, RateLimitError) or getattr(error, "status_code", None) == 429
+
+def backoff_delay(attempt, error=None):
+    """Espera antes del reintento: Retry-After si el servidor lo indica; si no, exponencial con jitter completo."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), BACKOFF_MAX)
+    except ValueError:
+        pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def _close_stream(response):
+    """Cierra un Stream de Groq (y su respuesta HTTP); los errores al cerrar no importan."""
+    close = getattr(response, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+
+class _StreamStartError(Exception):
+    """El modelo falló antes de enviar el primer fragmento (aún se puede probar otro modelo)."""
 
 # --- Clase AIAssistant ---
 class AIAssistant:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, client=None, use_cache=True,
+                 timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES, hedge_after=HEDGE_AFTER):
         self.api_key = api_key or os.getenv("GROQ_API_KEY")
-        if self.api_key:
+        self.use_cache = use_cache
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+        if client is None and os.getenv("SEITH_AI_BACKEND") == "stub":
+            from src.utils.ai_stub import StubClient
+            client = StubClient()
+
+        if client is not None:
+            # Cliente inyectado (p. ej. StubClient para trabajar sin conexión)
+            self.client = client
+        elif self.api_key:
             try:
-                self.client = Groq(api_key=self.api_key)
+                self.client = get_client(self.api_key)
             except Exception as e:
                 print(f"Error al inicializar Groq: {e}")
                 self.client = None
         else:
             self.client = None
 
-    # --- Métodos de explicación taxonómica ---
-    def get_taxonomic_explanation(self, species_name, common_name, detected_features):
-        """Genera una explicación experta sobre por qué se llegó a esa identificación usando Groq."""
-        if not self.client:
-            return "Asistente IA (Groq) no configurado. Por favor, añada su API KEY de Groq."
-
+    # --- Construcción de prompts ---
+    def _explanation_messages(self, species_name, common_name, detected_features):
+        """Mensajes para el modelo principal y para el alternativo."""
         prompt = f"""
         Actúa como un experto mundial en taxonomía de la familia Hippidae (cangrejos topo).
         Se ha identificado un espécimen como: {species_name} ({common_name}).
@@ -34,39 +148,20 @@ class AIAssistant:
         Responde en español, sé directo y profesional.
         """
         
-        try:
-            # Usamos llama-3.3-70b-versatile o mixtral-8x7b-32768 que son muy estables en Groq
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Eres un biólogo experto en crustáceos decápodos."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model="llama-3.3-70b-versatile",
-            )
-            return chat_completion.choices[0].message.content
-        except Exception as e:
-            # Intentar con un modelo alternativo si el primero falla
-            try:
-                chat_completion = self.client.chat.completions.create(
-                    messages=[{"role": "user", "content": prompt}],
-                    model="mixtral-8x7b-32768",
-                )
-                return chat_completion.choices[0].message.content
-            except:
-                return f"Error en Groq: {str(e)}"
-
-    # --- Métodos de consulta interactiva ---
-    def chat_query(self, user_question, context_info=""):
-        """Permite al usuario hacer preguntas libres al experto, limitando el alcance."""
-        if not self.client:
-            return "Asistente Groq no configurado."
+        primary_messages = [
+            {
+                "role": "system",
+                "content": "Eres un biólogo experto en crustáceos decápodos."
+            },
+            {
+                "role": "user",
+                "content": prompt,
+            }
+        ]
+        fallback_messages = [{"role": "user", "content": prompt}]
+        return primary_messages, fallback_messages
 
+    def _chat_messages(self, user_question, context_info):
         # Prompt Maestro: El "Cerebro" de SEITH
         system_prompt = """
         Eres el Profesor Experto del sistema SEITH (Sistema Experto de Identificación de Taxones de Hippidae). 
@@ -79,17 +174,197 @@ class AIAssistant:
         3. Usa un tono académico, amable y motivador para los estudiantes.
         4. Si hay un diagnóstico previo, úsalo para dar detalles específicos.
         """
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Contexto del hallazgo: {context_info}\nPregunta del estudiante: {user_question}"}
+        ]
+
+    def _cached_explanation(self, primary_messages, fallback_messages):
+        # El prompt solo depende de la especie y los rasgos: una respuesta ya obtenida no gasta cuota
+        for messages, model in ((primary_messages, PRIMARY_MODEL), (fallback_messages, FALLBACK_MODEL)):
+            cached = self._cache_get(messages, model)
+            if cached is not None:
+                return cached
+        return None
+
+    # --- Métodos de explicación taxonómica ---
+    def get_taxonomic_explanation(self, species_name, common_name, detected_features):
+        """Genera una explicación experta sobre por qué se llegó a esa identificación usando Groq."""
+        if not self.client:
+            return "Asistente IA (Groq) no configurado. Por favor, añada su API KEY de Groq."
+
+        primary_messages, fallback_messages = self._explanation_messages(species_name, common_name, detected_features)
+        cached = self._cached_explanation(primary_messages, fallback_messages)
+        if cached is not None:
+            return cached
 
         try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Contexto del hallazgo: {context_info}\nPregunta del estudiante: {user_question}"}
-                ],
-                model="llama-3.3-70b-versatile",
-                temperature=0.7,
-                max_tokens=500
+            # Usamos llama-3.3-70b-versatile o mixtral-8x7b-32768 que son muy estables en Groq
+            # El alternativo entra si el principal falla o tarda más de hedge_after
+            return self._complete_first(
+                [(primary_messages, PRIMARY_MODEL, {}), (fallback_messages, FALLBACK_MODEL, {})], cache=True
             )
-            return chat_completion.choices[0].message.content
+        except Exception as e:
+            return f"Error en Groq: {str(e)}"
+
+    def stream_taxonomic_explanation(self, species_name, common_name, detected_features):
+        """Como get_taxonomic_explanation, pero genera el texto por fragmentos a medida que llega."""
+        if not self.client:
+            yield "Asistente IA (Groq) no configurado. Por favor, añada su API KEY de Groq."
+            return
+
+        primary_messages, fallback_messages = self._explanation_messages(species_name, common_name, detected_features)
+        cached = self._cached_explanation(primary_messages, fallback_messages)
+        if cached is not None:
+            yield cached
+            return
+
+        try:
+            yield from self._stream_cached(primary_messages, PRIMARY_MODEL)
+        except _StreamStartError as e:
+            # Solo se cambia de modelo si el principal falló antes de enviar texto
+            try:
+                yield from self._stream_cached(fallback_messages, FALLBACK_MODEL)
+            except Exception:
+                yield f"Error en Groq: {str(e.__cause__)}"
+        except Exception as e:
+            yield f"\n[Error en Groq: {str(e)}]"
+
+    # --- Caché de respuestas ---
+    def _cache_get(self, messages, model, **params):
+        if not self.use_cache:
+            return None
+        try:
+            return _get_response_cache().get(prompt_key(messages, model, **params))
+        except Exception as e:
+            print(f"Error en la caché de IA: {e}")
+            return None
+
+    def _cache_set(self, messages, model, content, **params):
+        if self.use_cache and content:
+            try:
+                _get_response_cache().set(prompt_key(messages, model, **params), content)
+            except Exception as e:
+                print(f"Error en la caché de IA: {e}")
+
+    def _complete(self, messages, model, **params):
+        return self._create(messages, model, **params).choices[0].message.content
+
+    def _complete_cached(self, messages, model, **params):
+        """Pide la respuesta al modelo y la guarda en la caché persistente."""
+        content = self._complete(messages, model, **params)
+        self._cache_set(messages, model, content, **params)
+        return content
+
+    # --- Timeouts, reintentos y modelo alternativo ---
+    def _create(self, messages, model, **params):
+        """Una petición con timeout; ante límite de tasa se reintenta con backoff exponencial y jitter."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.client.chat.completions.create(
+                    messages=messages, model=model, timeout=self.timeout, **params
+                )
+            except Exception as e:
+                if attempt == self.max_retries or not _is_rate_limited(e):
+                    raise
+                time.sleep(backoff_delay(attempt, e))
+
+    def _complete_first(self, candidates, cache=False):
+        """
+        candidates: [(mensajes, modelo, parámetros)] por orden de preferencia. Devuelve la primera
+        respuesta válida. Con hedge_after, el siguiente modelo se lanza en paralelo si el anterior
+        falla o tarda más de hedge_after segundos; gana la primera respuesta buena.
+        """
+        run = self._complete_cached if cache else self._complete
+        first_error = None
+
+        if self.hedge_after is None:
+            for messages, model, params in candidates:
+                try:
+                    content = run(messages, model, **params)
+                    if content:
+                        return content
+                except Exception as e:
+                    first_error = first_error or e
+            raise first_error or RuntimeError("respuesta vacía")
+
+        pending = set()
+        remaining = list(candidates)
+        messages, model, params = remaining.pop(0)
+        pending.add(_run_detached(run, messages, model, **params))
+        while pending:
+            done, pending = wait(pending, timeout=self.hedge_after if remaining else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and future.result():
+                    return future.result() # La petición perdedora termina sola y se ignora
+                first_error = first_error or future.exception()
+            if remaining:
+                # El modelo en curso falló o es lento: se lanza el siguiente sin cancelar el anterior
+                messages, model, params = remaining.pop(0)
+                pending.add(_run_detached(run, messages, model, **params))
+        raise first_error or RuntimeError("respuesta vacía")
+
+    # --- Streaming ---
+    def _stream(self, messages, model, **params):
+        """
+        Genera los fragmentos de texto de la respuesta (stream=True de la API de Groq).
+        La respuesta se cierra siempre al terminar, también si quien consume deja de leer a medias
+        (close() del generador): así la conexión vuelve enseguida a la sesión HTTP compartida.
+        """
+        response = None
+        try:
+            response = self._create(messages, model, stream=True, **params)
+            chunks = iter(response)
+            first = next(chunks, None)
+        except Exception as e:
+            _close_stream(response)
+            raise _StreamStartError() from e
+
+        try:
+            if first is None:
+                return
+            for chunk in chain((first,), chunks):
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        finally:
+            _close_stream(response)
+
+    def _stream_cached(self, messages, model, **params):
+        """Streaming de una respuesta que, al completarse, se guarda en la caché."""
+        parts = []
+        for delta in self._stream(messages, model, **params):
+            parts.append(delta)
+            yield delta
+        self._cache_set(messages, model, "".join(parts), **params)
+
+    # --- Métodos de consulta interactiva ---
+    def chat_query(self, user_question, context_info=""):
+        """Permite al usuario hacer preguntas libres al experto, limitando el alcance."""
+        if not self.client:
+            return "Asistente Groq no configurado."
+
+        messages = self._chat_messages(user_question, context_info)
+        params = {"temperature": 0.7, "max_tokens": 500}
+        try:
+            return self._complete_first([(messages, PRIMARY_MODEL, params), (messages, FALLBACK_MODEL, params)])
         except Exception as e:
             return f"Error en la conversación: {str(e)}"
+
+    def stream_chat_query(self, user_question, context_info=""):
+        """Como chat_query, pero genera el texto por fragmentos a medida que llega."""
+        if not self.client:
+            yield "Asistente Groq no configurado."
+            return
+
+        messages = self._chat_messages(user_question, context_info)
+        try:
+            yield from self._stream(messages, PRIMARY_MODEL, temperature=0.7, max_tokens=500)
+        except _StreamStartError as e:
+            # Igual que en la explicación: modelo alternativo si el principal no llegó a responder
+            try:
+                yield from self._stream(messages, FALLBACK_MODEL, temperature=0.7, max_tokens=500)
+            except Exception:
+                yield f"Error en la conversación: {str(e.__cause__)}"
+        except Exception as e:
+            yield f"\n[Error en la conversación: {str(e)}]"
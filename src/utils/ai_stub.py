@@ -0,0 +1,64 @@
+""" **************************
+    ***     AI_STUB.PY      ***
+    ************************** """
+# Este archivo contiene StubClient: un cliente local con la misma interfaz que groq.Groq
+# (client.chat.completions.create, también con stream=True) que responde sin red ni API Key.
+# Sirve para desarrollar y probar el Orientador IA sin conexión (SEITH_AI_BACKEND=stub)
+# y para contar las llamadas reales.
+
+# --- Importaciones ---
+import re
+import time
+from types import SimpleNamespace
+
+# --- Respuesta en streaming ---
+class StubStream:
+    """Iterable de fragmentos con close(), como groq.Stream (que al cerrarse libera la conexión HTTP)."""
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        self.closed = True
+        self._chunks.close()
+
+# --- Clase principal ---
+class StubClient:
+    def __init__(self, latency=0.0, reply=None, token_delay=0.02):
+        self.latency = latency # Segundos que tarda cada respuesta (simula la red)
+        self.token_delay = token_delay # Pausa entre fragmentos en modo streaming
+        self.reply = reply # Texto fijo o función(messages, model) -> texto
+        self.calls = [] # (modelo, mensajes) de cada petición recibida
+        self.streams = [] # Respuestas en modo streaming entregadas (para comprobar que se cierran)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _answer(self, messages, model):
+        if callable(self.reply):
+            return self.reply(messages, model)
+        if self.reply is not None:
+            return self.reply
+        question = messages[-1]["content"].strip().splitlines()[-1].strip()
+        return f"[{model} - respuesta local] {question}"
+
+    def _create(self, messages, model, stream=False, **params):
+        self.calls.append((model, messages))
+        if self.latency:
+            time.sleep(self.latency)
+        content = self._answer(messages, model)
+        if stream:
+            response = StubStream(self._stream(content, model))
+            self.streams.append(response)
+            return response
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")])
+
+    def _stream(self, content, model):
+        """Fragmentos con la forma de los de Groq (choices[0].delta.content), palabra a palabra."""
+        for token in re.findall(r"\s*\S+", content):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            delta = SimpleNamespace(role="assistant", content=token)
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
@@ -7,6 +7,96 @@
 import cv2
 import numpy as np
 import os
+import uuid
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from PIL import Image
+from src.utils.sqlite_cache import SQLiteCache
+from src.utils import morphometrics
+
+# --- Resolución de análisis ---
+# La segmentación se hace sobre una versión reducida (lado mayor <= ANALYSIS_MAX_SIDE) y las
+# coordenadas se reescalan al original. None analiza a resolución completa.
+ANALYSIS_MAX_SIDE = 1024
+# Decodificación reducida nativa de OpenCV (en JPEG escala en la DCT: menos tiempo y memoria)
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+# --- Caché de análisis por contenido ---
+# Una foto sin cambios no se vuelve a segmentar: el resultado se busca por el hash de su contenido.
+# La clave incluye la resolución de análisis y la versión del código de este archivo, así que
+# cualquier cambio en los parámetros de segmentación invalida la caché automáticamente.
+ANALYSIS_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_code_hash = hashlib.blake2b(digest_size=8)
+for _source_path in (__file__, morphometrics.__file__):
+    with open(_source_path, "rb") as _source:
+        _code_hash.update(_source.read())
+CODE_VERSION = _code_hash.hexdigest()
+_analysis_cache = None
+
+def _get_analysis_cache():
+    global _analysis_cache
+    if _analysis_cache is None:
+        _analysis_cache = SQLiteCache("image_analysis", max_bytes=ANALYSIS_CACHE_MAX_BYTES)
+    return _analysis_cache
+
+def content_hash(image_path):
+    """Hash rápido (BLAKE2b) del contenido del archivo, leído por bloques de 1 MiB."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(image_path, "rb") as f:
+        # Sin hashlib.file_digest: solo existe desde Python 3.11 y SEITH admite 3.10
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _original_size(image_path):
+    """Tamaño (ancho, alto) del original leyendo solo la cabecera, con la orientación EXIF aplicada."""
+    with Image.open(image_path) as im:
+        width, height = im.size
+        # Rotaciones EXIF de 90° en JPEG: OpenCV las aplica al decodificar
+        if im.format in ("JPEG", "MPO") and im.getexif().get(0x0112) in (5, 6, 7, 8):
+            width, height = height, width
+    return width, height
+
+def load_for_analysis(image_path, max_side=ANALYSIS_MAX_SIDE):
+    """
+    Decodifica la imagen a resolución de análisis.
+    Devuelve (imagen BGR, escala_x, escala_y) donde escala = original / reducida, o (None, 1, 1).
+    """
+    if not max_side:
+        return cv2.imread(image_path), 1.0, 1.0
+    try:
+        width, height = _original_size(image_path)
+    except Exception:
+        # Formato que PIL no reconoce: se decodifica completo y se reduce después
+        img = cv2.imread(image_path)
+        if img is None:
+            return None, 1.0, 1.0
+        height, width = img.shape[:2]
+    else:
+        flag = next((f for factor, f in REDUCED_FLAGS if max(width, height) / factor >= max_side), cv2.IMREAD_COLOR)
+        img = cv2.imread(image_path, flag)
+        if img is None:
+            return None, 1.0, 1.0
+
+    small_h, small_w = img.shape[:2]
+    if max(small_w, small_h) > max_side:
+        ratio = max_side / max(small_w, small_h)
+        img = cv2.resize(img, (max(1, round(small_w * ratio)), max(1, round(small_h * ratio))), interpolation=cv2.INTER_AREA)
+        small_h, small_w = img.shape[:2]
+    return img, width / small_w, height / small_h
+
+def _draw_overlay(img, contour, bbox, shape_type):
+    """Dibuja sobre img (en su propia escala) el contorno, el cuadro y la etiqueta detectados."""
+    x, y, w, h = bbox
+    # Dibujar contorno en verde cian
+    cv2.drawContours(img, [contour.reshape(-1, 1, 2)], -1, (255, 255, 0), 2)
+    # Dibujar cuadro delimitador
+    cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 255), 2)
+    # Añadir etiqueta (Ajuste dinámico para que no se corte arriba)
+    text_y = y - 10 if y > 30 else y + 25
+    cv2.putText(img, f"IA: {shape_type.upper()}", (x, text_y),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    return img
 
 # --- Clase principal ---
 class ImageHelper:
@@ -14,66 +104,171 @@ class ImageHelper:
     # @staticmethod es un decorador que permite que un metodo sea llamado sin necesidad de crear una instancia de la clase
     
     # Función que procesa la imagen y detecta rasgos taxonómicos básicos
-    def process_image(image_path):
+    def process_image(image_path, max_side=ANALYSIS_MAX_SIDE, overlay_dir=None, use_cache=True):
         """
         Analiza la imagen para detectar rasgos taxonómicos básicos.
         Extrae contornos y dimensiones del espécimen.
+        max_side fija la resolución de análisis (None = resolución completa).
+        La visualización no se escribe en disco: se obtiene bajo demanda con render_overlay().
+        Con overlay_dir se guarda además un PNG con nombre único en esa carpeta ("processed_image").
+        use_cache reutiliza el análisis previo de una imagen con el mismo contenido.
         """
         try:
-            img = cv2.imread(image_path)
-            if img is None: return None
-            
-            # 1. Preprocesamiento
-            # Reducir ruido y convertir a escala de grises
-            blur = cv2.GaussianBlur(img, (5, 5), 0)
-            gray = cv2.cvtColor(blur, cv2.COLOR_BGR2GRAY)
-            
-            # 2. Segmentación (Canny edge detection o Thresholding)
-            # Usamos Otsu's thresholding para separar al espécimen del fondo
-            _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-            
-            # 3. Detección de Contornos
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            if not contours:
-                return {"status": "no_specimen_detected"}
-                
-            # Tomar el contorno más grande (asumimos que es el espécimen)
-            c = max(contours, key=cv2.contourArea) if len(contours) > 0 else None
-            if c is None: return None
-            
-            # 4. Análisis de Forma (Conceptualización Taxonómica)
-            x, y, w, h = cv2.boundingRect(c)
-            aspect_ratio = float(w)/h
-            
-            # Clasificar forma
-            shape_type = "ovalado" if aspect_ratio < 0.8 else "subcilindrico"
-            
-            # --- NUEVO: Dibujar resaltado visual ---
-            processed_img = img.copy()
-            # Dibujar contorno en verde cian
-            cv2.drawContours(processed_img, [c], -1, (255, 255, 0), 2)
-            # Dibujar cuadro delimitador
-            cv2.rectangle(processed_img, (x, y), (x + w, y + h), (0, 255, 255), 2)
-            # Añadir etiqueta (Ajuste dinámico para que no se corte arriba)
-            text_y = y - 10 if y > 30 else y + 25
-            cv2.putText(processed_img, f"IA: {shape_type.upper()}", (x, text_y), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-            
-            # Guardar visualización temporal
-            temp_path = os.path.join("assets", "temp_detection.png")
-            cv2.imwrite(temp_path, processed_img)
-            
-            return {
-                "status": "success",
-                "aspect_ratio": round(aspect_ratio, 2),
-                "detected_shape": shape_type,
-                "bbox": (x, y, w, h),
-                "processed_image": temp_path
-            }
+            if use_cache and not overlay_dir:
+                return ImageHelper._analyze_cached(image_path, max_side)
+            return ImageHelper._analyze(image_path, overlay_dir, max_side)
         except Exception as e:
             print(f"Error en ImageHelper: {e}")
             return None
 
+    @staticmethod
+    def _analyze(image_path, overlay_dir=None, max_side=ANALYSIS_MAX_SIDE):
+        """Análisis de una imagen; las excepciones se propagan a quien llama."""
+        img, scale_x, scale_y = load_for_analysis(image_path, max_side)
+        if img is None: return None
+
+        # 1. Preprocesamiento
+        # Reducir ruido y convertir a escala de grises
+        blur = cv2.GaussianBlur(img, (5, 5), 0)
+        gray = cv2.cvtColor(blur, cv2.COLOR_BGR2GRAY)
+
+        # 2. Segmentación (Canny edge detection o Thresholding)
+        # Usamos Otsu's thresholding para separar al espécimen del fondo
+        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+        # 3. Detección de Contornos
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        if not contours:
+            return {"status": "no_specimen_detected"}
+
+        # Tomar el contorno más grande (asumimos que es el espécimen)
+        c = max(contours, key=cv2.contourArea) if len(contours) > 0 else None
+        if c is None: return None
+
+        # 4. Análisis de Forma (Conceptualización Taxonómica)
+        x, y, w, h = cv2.boundingRect(c)
+        # Coordenadas en la imagen original
+        bbox = (round(x * scale_x), round(y * scale_y), round(w * scale_x), round(h * scale_y))
+        contour = np.rint(c.reshape(-1, 2) * (scale_x, scale_y)).astype(int)
+        aspect_ratio = float(bbox[2])/bbox[3]
+
+        # Clasificar forma
+        shape_type = "ovalado" if aspect_ratio < morphometrics.OVAL_ASPECT_RATIO else "subcilindrico"
+
+        # 5. Morfometría (momentos de Hu, solidez, excentricidad, curvatura y textura)
+        # La textura se mide sobre la imagen sin suavizar
+        raw_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        measures, traits = morphometrics.extract_features(raw_gray, c.reshape(-1, 2), aspect_ratio)
+
+        result = {
+            "status": "success",
+            "aspect_ratio": round(aspect_ratio, 2),
+            "detected_shape": shape_type,
+            "bbox": bbox,
+            "contour": contour.tolist(),
+            "morphometrics": measures,
+            "traits": traits, # Rasgos listos para ExpertEngine (forma y, si es concluyente, superficie)
+            "processed_image": None
+        }
+        if not overlay_dir:
+            return result
+
+        # Visualización en disco para lotes: ruta única, así los análisis concurrentes no se pisan
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        overlay_path = os.path.join(overlay_dir, f"{stem}_{uuid.uuid4().hex[:8]}_deteccion.png")
+        # Se dibuja sobre la imagen ya decodificada a resolución de análisis
+        _draw_overlay(img, c.reshape(-1, 2), (x, y, w, h), shape_type)
+        cv2.imwrite(overlay_path, img)
+        result["processed_image"] = overlay_path
+        return result
+
+    @staticmethod
+    def _analyze_cached(image_path, max_side=ANALYSIS_MAX_SIDE):
+        """Como _analyze, pero consultando primero la caché por contenido."""
+        cache = _get_analysis_cache()
+        key = f"{content_hash(image_path)}:{max_side}:{CODE_VERSION}"
+        result = cache.get(key)
+        if result is not None:
+            if "bbox" in result:
+                result["bbox"] = tuple(result["bbox"])
+            return result
+
+        result = ImageHelper._analyze(image_path, None, max_side)
+        if result is not None: # Las imágenes ilegibles no se guardan
+            cache.set(key, result)
+        return result
+
+    # Visualización del análisis, generada solo cuando se va a mostrar
+    @staticmethod
+    def render_overlay(image_path, analysis, max_side=360):
+        """
+        Devuelve la imagen anotada (contorno, cuadro y etiqueta) como arreglo RGB de NumPy,
+        decodificada directamente a resolución de pantalla (lado mayor <= max_side).
+        """
+        img, scale_x, scale_y = load_for_analysis(image_path, max_side)
+        if img is None or not analysis or analysis.get("status") != "success":
+            return None
+        # Coordenadas originales -> coordenadas de pantalla
+        contour = np.rint(np.asarray(analysis["contour"]) / (scale_x, scale_y)).astype(np.int32)
+        x, y, w, h = analysis["bbox"]
+        bbox = (round(x / scale_x), round(y / scale_y), round(w / scale_x), round(h / scale_y))
+        _draw_overlay(img, contour, bbox, analysis["detected_shape"])
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    @staticmethod
+    def encode_overlay(image_path, analysis, max_side=360, ext=".png"):
+        """Igual que render_overlay, pero codificada en memoria (bytes PNG/JPEG)."""
+        rgb = ImageHelper.render_overlay(image_path, analysis, max_side)
+        if rgb is None:
+            return None
+        ok, buffer = cv2.imencode(ext, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+        return buffer.tobytes() if ok else None
+
+    # Análisis por lotes en paralelo (una carpeta con miles de fotos)
+    @staticmethod
+    def process_images(paths, workers=None, max_side=ANALYSIS_MAX_SIDE, overlay_dir=None, use_cache=True):
+        """
+        Analiza muchas imágenes repartiéndolas en un pool de procesos.
+        Genera los resultados a medida que terminan (no en el orden de entrada); cada resultado
+        lleva su "path" y los errores se devuelven como {"status": "error", "message": ...}.
+        Con overlay_dir cada visualización se guarda con un nombre único en esa carpeta.
+        """
+        workers = workers or os.cpu_count() or 1
+        max_pending = workers * 4 # Tope de tareas en vuelo: la lista de rutas puede ser un generador enorme
+        paths = iter(paths)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker) as pool:
+            pending = set()
+            while True:
+                for path in paths:
+                    pending.add(pool.submit(_analyze_in_worker, path, max_side, overlay_dir, use_cache))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+# --- Funciones del pool de procesos ---
+def _init_pool_worker():
+    # Un hilo de OpenCV por proceso: el paralelismo ya lo da el pool
+    cv2.setNumThreads(1)
+
+def _analyze_in_worker(image_path, max_side=ANALYSIS_MAX_SIDE, overlay_dir=None, use_cache=True):
+    """Analiza una imagen capturando cualquier error en el propio resultado."""
+    try:
+        if use_cache and not overlay_dir:
+            result = ImageHelper._analyze_cached(image_path, max_side)
+        else:
+            result = ImageHelper._analyze(image_path, overlay_dir, max_side)
+        if result is None:
+            result = {"status": "error", "message": "No se pudo leer la imagen"}
+    except Exception as e:
+        result = {"status": "error", "message": str(e)}
+    result["path"] = image_path
+    return result
+
 # Instancia global
 image_helper = ImageHelper()
@@ -0,0 +1,177 @@
+""" **************************
+    ***   MORPHOMETRICS.PY   ***
+    ************************** """
+# Este archivo contiene la extracción de rasgos morfométricos del espécimen segmentado
+# (forma y textura) y su traducción a rasgos que entiende el ExpertEngine.
+# Todo está vectorizado con NumPy/OpenCV: no hay bucles de Python sobre píxeles ni puntos.
+
+# --- Importaciones ---
+import cv2
+import numpy as np
+
+# --- Umbrales de clasificación ---
+# Heurísticos y provisionales: aún no se han calibrado con ejemplares etiquetados como lisos o rugosos.
+# Por eso la superficie solo se entrega al motor experto cuando la medida queda claramente lejos del
+# umbral (fuera de la banda TEXTURE_MARGIN) y el espécimen se separó del fondo; si no, queda solo
+# como dato en la morfometría. La textura se mide siempre a escala TEXTURE_SIDE.
+OVAL_ASPECT_RATIO = 0.8      # Bajo este ancho/alto el caparazón se considera "ovalado"
+ROUGH_THRESHOLD = 0.045      # Desviación local media (0-1) a partir de la cual la superficie es "rugosa"
+STRIATION_COHERENCE = 0.5    # Coherencia media de orientación a partir de la cual la textura es "estriada"
+TEXTURE_MARGIN = 0.25        # Banda de indecisión relativa alrededor de cada umbral (±25 %)
+CONTOUR_SAMPLES = 128        # Puntos del contorno remuestreado para medir la curvatura
+TEXTURE_SIDE = 128           # Lado mayor (px) al que se remuestrea el espécimen antes de medir la textura
+TEXTURE_WINDOW = 7           # Ventana (px, a escala TEXTURE_SIDE) de la varianza local y del tensor de estructura
+
+# --- Forma ---
+def _resample_contour(points, n=CONTOUR_SAMPLES):
+    """Remuestrea el contorno cerrado a n puntos equiespaciados por longitud de arco."""
+    closed = np.vstack([points, points[:1]]).astype(float)
+    seg = np.hypot(*np.diff(closed, axis=0).T)
+    arc = np.concatenate([[0], np.cumsum(seg)])
+    if arc[-1] == 0:
+        return np.repeat(closed[:1], n, axis=0)
+    t = np.linspace(0, arc[-1], n, endpoint=False)
+    return np.column_stack([np.interp(t, arc, closed[:, 0]), np.interp(t, arc, closed[:, 1])])
+
+def shape_descriptors(contour):
+    """Momentos de Hu, solidez, excentricidad y curvatura de un contorno (N x 2)."""
+    contour = np.asarray(contour, dtype=np.int32).reshape(-1, 1, 2)
+    moments = cv2.moments(contour)
+    # Momentos de Hu en escala logarítmica (invariantes a traslación, escala y rotación)
+    hu = cv2.HuMoments(moments).flatten()
+    hu_log = -np.sign(hu) * np.log10(np.abs(hu) + 1e-30)
+
+    area = cv2.contourArea(contour)
+    hull_area = cv2.contourArea(cv2.convexHull(contour))
+    solidity = area / hull_area if hull_area > 0 else 0.0
+
+    # Excentricidad de la elipse equivalente (autovalores de los momentos centrales de orden 2)
+    mu20, mu02, mu11 = moments["mu20"], moments["mu02"], moments["mu11"]
+    spread = np.sqrt(4 * mu11 ** 2 + (mu20 - mu02) ** 2)
+    major, minor = mu20 + mu02 + spread, mu20 + mu02 - spread
+    eccentricity = float(np.sqrt(1 - minor / major)) if major > 0 else 0.0
+
+    # Curvatura: giro acumulado del contorno respecto al de una figura convexa (2*pi). 1.0 = sin ondulaciones
+    pts = _resample_contour(contour.reshape(-1, 2))
+    d = np.diff(np.vstack([pts, pts[:1]]), axis=0)
+    heading = np.arctan2(d[:, 1], d[:, 0])
+    turn = np.angle(np.exp(1j * (np.roll(heading, -1) - heading)))
+    bending = float(np.abs(turn).sum() / (2 * np.pi))
+
+    return {
+        "hu_moments": [round(float(h), 4) for h in hu_log],
+        "solidity": round(float(solidity), 4),
+        "eccentricity": round(eccentricity, 4),
+        "curvature": round(bending, 4)
+    }
+
+# --- Textura ---
+def _lbp_codes(gray):
+    """Códigos LBP de 8 vecinos (radio 1) para toda la imagen, sin bucles sobre píxeles."""
+    center = gray[1:-1, 1:-1]
+    offsets = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+    h, w = gray.shape
+    codes = np.zeros(center.shape, dtype=np.uint8)
+    for bit, (dy, dx) in enumerate(offsets):
+        neighbour = gray[1 + dy:h - 1 + dy, 1 + dx:w - 1 + dx]
+        codes |= (neighbour >= center).astype(np.uint8) << bit
+    return codes
+
+# Patrones "uniformes" (como mucho 2 transiciones 0/1): bordes y zonas planas, no ruido
+_UNIFORM = np.array([bin(c ^ ((c >> 1) | ((c & 1) << 7))).count("1") <= 2 for c in range(256)])
+
+def texture_descriptors(gray, mask):
+    """Rugosidad (desviación local), coherencia de orientación e histograma LBP dentro de la máscara."""
+    inside = mask > 0
+    if not inside.any():
+        return {"roughness": 0.0, "coherence": 0.0, "lbp_uniformity": 1.0, "lbp_entropy": 0.0}
+
+    g = gray.astype(np.float32) / 255.0
+    win = (TEXTURE_WINDOW, TEXTURE_WINDOW)
+
+    # Varianza local: E[x^2] - E[x]^2 con filtros de caja
+    mean = cv2.blur(g, win)
+    local_std = np.sqrt(np.maximum(cv2.blur(g * g, win) - mean * mean, 0))
+    roughness = float(local_std[inside].mean())
+
+    # Tensor de estructura: las estrías tienen gradientes con una orientación dominante
+    gx = cv2.Sobel(g, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(g, cv2.CV_32F, 0, 1, ksize=3)
+    jxx, jyy, jxy = cv2.blur(gx * gx, win), cv2.blur(gy * gy, win), cv2.blur(gx * gy, win)
+    energy = jxx + jyy
+    coherence_map = np.sqrt((jxx - jyy) ** 2 + 4 * jxy ** 2) / (energy + 1e-6)
+    weights = energy[inside]
+    coherence = float((coherence_map[inside] * weights).sum() / weights.sum()) if weights.sum() > 0 else 0.0
+
+    # Histograma LBP
+    codes = _lbp_codes(gray)[inside[1:-1, 1:-1]]
+    hist = np.bincount(codes, minlength=256).astype(float)
+    hist /= max(hist.sum(), 1)
+    nonzero = hist[hist > 0]
+    return {
+        "roughness": round(roughness, 4),
+        "coherence": round(coherence, 4),
+        "lbp_uniformity": round(float(hist[_UNIFORM].sum()), 4),
+        "lbp_entropy": round(float(-(nonzero * np.log2(nonzero)).sum()), 4)
+    }
+
+def specimen_patch(gray, mask, bbox, side=TEXTURE_SIDE):
+    """
+    Recorta el espécimen (bbox = x, y, ancho, alto) y lo remuestrea a lado mayor = side.
+    Así la textura se mide siempre a la misma escala del espécimen, sea cual sea la resolución de la foto.
+    """
+    x, y, w, h = bbox
+    gray, mask = gray[y:y + h, x:x + w], mask[y:y + h, x:x + w]
+    ratio = side / max(w, h, 1)
+    size = (max(1, round(w * ratio)), max(1, round(h * ratio)))
+    # INTER_AREA promedia al reducir (sin aliasing); al ampliar basta la interpolación lineal
+    interpolation = cv2.INTER_AREA if ratio < 1 else cv2.INTER_LINEAR
+    return cv2.resize(gray, size, interpolation=interpolation), cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+
+# --- Traducción a rasgos del motor experto ---
+def fills_frame(bbox, image_shape):
+    """True si el contorno ocupa toda la imagen: la segmentación tomó el fondo, no el espécimen."""
+    x, y, w, h = bbox
+    height, width = image_shape[:2]
+    return x <= 1 and y <= 1 and x + w >= width - 1 and y + h >= height - 1
+
+def surface_from_texture(texture):
+    """
+    Clasifica la superficie ("liso", "rugoso" o "estriado") y dice si la medida es concluyente,
+    es decir, si rugosidad y coherencia quedan fuera de la banda de indecisión de su umbral.
+    """
+    rough = texture["roughness"] / ROUGH_THRESHOLD
+    coherence = texture["coherence"] / STRIATION_COHERENCE
+    if rough < 1:
+        return "liso", rough <= 1 - TEXTURE_MARGIN
+    surface = "estriado" if coherence >= 1 else "rugoso"
+    clear = rough >= 1 + TEXTURE_MARGIN and abs(coherence - 1) >= TEXTURE_MARGIN
+    return surface, clear
+
+def traits_from_descriptors(aspect_ratio, texture, segmented=True):
+    """
+    Convierte las medidas en rasgos compatibles con ExpertEngine: siempre la forma y, solo si la
+    segmentación es válida y la medida concluyente, la superficie (un rasgo de peso taxonómico alto).
+    """
+    shape = "ovalado" if aspect_ratio < OVAL_ASPECT_RATIO else "subcilindrico"
+    surface, clear = surface_from_texture(texture)
+    return [shape, surface] if segmented and clear else [shape]
+
+def extract_features(gray, contour, aspect_ratio):
+    """
+    Medidas morfométricas del espécimen (contorno en coordenadas de gray) y rasgos derivados.
+    Devuelve (morfometría, rasgos).
+    """
+    contour = np.asarray(contour, dtype=np.int32).reshape(-1, 1, 2)
+    mask = np.zeros(gray.shape, dtype=np.uint8)
+    cv2.drawContours(mask, [contour], -1, 255, thickness=-1)
+    bbox = cv2.boundingRect(contour)
+    texture = texture_descriptors(*specimen_patch(gray, mask, bbox))
+    segmented = not fills_frame(bbox, gray.shape)
+    surface, clear = surface_from_texture(texture)
+    morphometrics = {
+        **shape_descriptors(contour), **texture,
+        # La superficie medida se conserva aunque no se entregue al motor
+        "surface": surface, "surface_clear": clear, "segmented": segmented
+    }
+    return morphometrics, traits_from_descriptors(aspect_ratio, texture, segmented)
@@ -0,0 +1,218 @@
+""" **************************
+    ***    SPECIES_IO.PY     ***
+    ************************** """
+# Este archivo contiene la lectura, validación y escritura de catálogos de especies (CSV, JSON o JSONL)
+# para la importación y exportación masiva de la base de conocimiento, y la copia de sus imágenes.
+
+# --- Importaciones ---
+import csv
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# --- Constantes ---
+FIELDS = ("genus", "species", "common_name", "description", "key_features", "image_path")
+IMAGES_DIR = os.path.join("assets", "species_images")
+REFERENCE_MAX_SIDE = 1024 # La interfaz nunca muestra la referencia a más de 360 px
+# Género y especie válidos: letras, dígitos, espacios y . ' ( ) - (p. ej. "Emerita (Hippa)" o "cf. analoga").
+# El catálogo puede venir de terceros y el nombre forma parte del archivo de imagen: nada de / \ ni ".."
+NAME_PATTERN = re.compile(r"\w[\w .'()-]*")
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    return {".csv": "csv", ".json": "json"}.get(ext, "jsonl")
+
+# --- Lectura y validación ---
+def read_catalogue(path):
+    """Genera los registros del catálogo uno a uno (el JSON completo sí se carga: es una lista)."""
+    fmt = detect_format(path)
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        elif fmt == "json":
+            data = json.load(f)
+            yield from (data.get("species", []) if isinstance(data, dict) else data)
+        else:
+            yield from (json.loads(line) for line in f if line.strip())
+
+def _features_list(value):
+    """Texto de rasgos -> lista. Admite la forma JSON ('["a", "b"]') y el texto separado por "," o ";"."""
+    if not value:
+        return []
+    # Igual que el motor experto: primero JSON y, si no es una lista, texto separado por comas
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        parsed = None
+    items = parsed if isinstance(parsed, list) else re.split(r"[,;]", value)
+    return [str(v).strip() for v in items if str(v).strip()]
+
+def _features_text(value):
+    """Lista o texto de rasgos -> "rasgo1, rasgo2" (el formato que guarda el diálogo de edición)."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        value = _features_list(value)
+    return ", ".join(str(v).strip().lower() for v in value if str(v).strip())
+
+def validate_record(record, seen):
+    """
+    Devuelve (fila, error). La fila sigue el orden de FIELDS con image_path aún sin copiar.
+    seen acumula los pares (género, especie) ya vistos en el archivo para detectar duplicados.
+    """
+    if not isinstance(record, dict):
+        return None, "el registro no es un objeto"
+    values = {f: record.get(f) for f in FIELDS}
+    for f in ("genus", "species", "common_name", "description", "image_path"):
+        values[f] = str(values[f] or "").strip()
+    values["key_features"] = _features_text(values["key_features"])
+
+    if not values["genus"] or not values["species"]:
+        return None, "género y especie son obligatorios"
+    for f in ("genus", "species"):
+        if not NAME_PATTERN.fullmatch(values[f]) or ".." in values[f]:
+            return None, f"nombre no válido en {f}: {values[f]!r}"
+    if not values["key_features"]:
+        return None, "sin rasgos (key_features)"
+    name = (values["genus"].lower(), values["species"].lower())
+    if name in seen:
+        return None, f"duplicado en el archivo: {values['genus']} {values['species']}"
+    seen.add(name)
+    return tuple(values[f] for f in FIELDS), None
+
+# --- Imágenes ---
+def _resolve_image(image_path, base_dir):
+    for candidate in (os.path.join(base_dir, image_path), os.path.join(os.getcwd(), image_path)):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+def image_filename(genus, species):
+    """Nombre de archivo seguro para la imagen de referencia: solo letras, dígitos, "_" y "-"."""
+    slug = re.sub(r"[^\w-]+", "_", f"{genus}_{species}").strip("_").lower()
+    if not slug:
+        raise ValueError(f"nombre de especie no válido: {genus!r} {species!r}")
+    return f"{slug}.png"
+
+def store_image(source, genus, species):
+    """
+    Guarda la imagen en assets/species_images como PNG reducido a REFERENCE_MAX_SIDE (los PNG que ya
+    caben se copian tal cual). Devuelve la ruta relativa.
+    """
+    saved_path = os.path.join(IMAGES_DIR, image_filename(genus, species))
+    abs_saved_path = os.path.join(os.getcwd(), saved_path)
+    # Defensa adicional: el archivo final (resueltos los enlaces) debe quedar dentro de IMAGES_DIR
+    images_root = os.path.realpath(os.path.join(os.getcwd(), IMAGES_DIR))
+    if os.path.dirname(os.path.realpath(abs_saved_path)) != images_root:
+        raise ValueError(f"ruta de imagen fuera de {IMAGES_DIR}: {saved_path}")
+    if os.path.abspath(source) == abs_saved_path:
+        return saved_path
+    with Image.open(source) as img:
+        if img.format == "PNG" and max(img.size) <= REFERENCE_MAX_SIDE:
+            shutil.copyfile(source, abs_saved_path)
+            return saved_path
+        img.draft("RGB", (REFERENCE_MAX_SIDE, REFERENCE_MAX_SIDE)) # JPEG: decodifica ya reducido
+        img.thumbnail((REFERENCE_MAX_SIDE, REFERENCE_MAX_SIDE))
+        img.save(abs_saved_path)
+    return saved_path
+
+def store_images(rows, base_dir, workers=None):
+    """
+    Copia en paralelo las imágenes de las filas y devuelve (filas con la ruta guardada, avisos).
+    Una imagen que falta o no se puede leer no descarta la especie: se importa sin imagen.
+    """
+    warnings = []
+
+    def store(row):
+        if not row[5]:
+            return row
+        source = _resolve_image(row[5], base_dir)
+        if source is None:
+            warnings.append(f"{row[0]} {row[1]}: no se encontró la imagen {row[5]}")
+            return row[:5] + ("",)
+        try:
+            return row[:5] + (store_image(source, row[0], row[1]),)
+        except Exception as e:
+            warnings.append(f"{row[0]} {row[1]}: imagen no válida ({e})")
+            return row[:5] + ("",)
+
+    os.makedirs(os.path.join(os.getcwd(), IMAGES_DIR), exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        stored = list(pool.map(store, rows))
+    return stored, warnings
+
+# --- Escritura (streaming) ---
+def write_catalogue(species_rows, path):
+    """Escribe las filas (id, genus, species, ...) de la tabla species sin acumularlas en memoria."""
+    fmt = detect_format(path)
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+        elif fmt == "json":
+            f.write("[\n")
+
+        for row in species_rows:
+            record = dict(zip(FIELDS, row[1:1 + len(FIELDS)]))
+            # En la base los rasgos pueden estar como lista JSON o como texto separado por comas
+            features = _features_list(record["key_features"])
+            if fmt == "csv":
+                record["key_features"] = ", ".join(features)
+                writer.writerow(record[field] for field in FIELDS)
+            else:
+                record["key_features"] = features
+                line = json.dumps(record, ensure_ascii=False)
+                if fmt == "json":
+                    line = ("  " if count == 0 else ",\n  ") + line
+                    f.write(line)
+                else:
+                    f.write(line + "\n")
+            count += 1
+
+        if fmt == "json":
+            f.write("\n]\n")
+    return count
+
+# --- Importación y exportación de la base de conocimiento ---
+def import_catalogue(path, database, workers=None):
+    """
+    Valida cada registro, copia las imágenes en paralelo e inserta todo en una sola transacción.
+    Las especies que ya están en la base se omiten (y su imagen no se sobrescribe).
+    Devuelve un informe {"status", "inserted", "skipped", "errors", "warnings"}.
+    """
+    try:
+        rows, errors, seen = [], [], set()
+        existing = {(r[1].lower(), r[2].lower()) for r in database.get_species_rules()}
+        skipped = 0
+        for n, record in enumerate(read_catalogue(path), start=1):
+            row, error = validate_record(record, seen)
+            if error:
+                errors.append(f"Registro {n}: {error}")
+            elif (row[0].lower(), row[1].lower()) in existing:
+                skipped += 1
+            else:
+                rows.append(row)
+    except Exception as e:
+        print(f"Error al leer el catálogo: {e}")
+        return {"status": "error", "message": str(e)}
+
+    rows, warnings = store_images(rows, os.path.dirname(os.path.abspath(path)), workers)
+    inserted = database.add_species_bulk(rows) if rows else 0
+    if inserted is None:
+        return {"status": "error", "message": "Error al guardar en base de datos"}
+
+    return {
+        "status": "success",
+        "inserted": inserted,
+        "skipped": skipped + len(rows) - inserted,
+        "errors": errors,
+        "warnings": warnings
+    }
+
+def export_catalogue(path, database):
+    """Exporta todas las especies de la base; devuelve cuántas se escribieron."""
+    return write_catalogue(database.iter_species(), path)
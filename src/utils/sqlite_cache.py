@@ -0,0 +1,98 @@
+""" **************************
+    ***   SQLITE_CACHE.PY    ***
+    ************************** """
+# Este archivo contiene la clase SQLiteCache: una caché persistente clave -> valor (JSON) en SQLite,
+# con caducidad opcional (TTL) y desalojo de las entradas menos usadas cuando supera un tamaño máximo.
+
+# --- Importaciones ---
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- Constantes ---
+CACHE_DB_NAME = "seith_cache.db" # Archivo aparte de seith_data.db: se puede borrar sin perder datos
+
+# --- Clase principal ---
+class SQLiteCache:
+    def __init__(self, table, max_bytes=64 * 1024 * 1024, ttl=None, db_name=CACHE_DB_NAME):
+        if not table.isidentifier():
+            raise ValueError(f"Nombre de tabla inválido: {table}")
+        self.table = table
+        self.max_bytes = max_bytes
+        self.ttl = ttl # Segundos de vida de cada entrada (None = sin caducidad)
+        self.db_path = os.path.join(os.getcwd(), db_name)
+        self._local = threading.local() # Una conexión por hilo, como en Database
+        self._init_table()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL") # Varios procesos del pool pueden escribir a la vez
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_table(self):
+        with self._connection() as conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+            ''')
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed)")
+
+    def get(self, key):
+        """Devuelve el valor guardado o None si no existe o caducó."""
+        conn = self._connection()
+        row = conn.execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        with conn:
+            if self.ttl is not None and now - row[1] > self.ttl:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """Guarda un valor serializable a JSON y desaloja lo más antiguo si se supera max_bytes."""
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        # Se borran las entradas menos usadas hasta liberar el exceso
+        victims = []
+        for key, size in conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self):
+        """Cantidad de entradas y bytes ocupados."""
+        row = self._connection().execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        return {"entries": row[0], "bytes": row[1], "max_bytes": self.max_bytes}
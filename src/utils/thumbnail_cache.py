@@ -0,0 +1,79 @@
+""" **************************
+    ***  THUMBNAIL_CACHE.PY  ***
+    ************************** """
+# Este archivo contiene la clase ThumbnailCache: miniaturas de las imágenes de referencia en una
+# caché LRU acotada en memoria y, opcionalmente, guardadas en disco para los siguientes arranques.
+
+# --- Importaciones ---
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+
+# --- Funciones de carga ---
+def load_thumbnail(path, size):
+    """
+    Decodifica la imagen directamente a tamaño reducido (draft de JPEG) y la ajusta a size
+    conservando la proporción. Nunca se mantiene en memoria la imagen completa.
+    """
+    with Image.open(path) as img:
+        img.draft("RGB", size) # Solo JPEG: decodifica a 1/2, 1/4 u 1/8 de la resolución
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(size)
+        return img.convert("RGBA") if img.mode in ("P", "LA") else img.copy()
+
+# --- Clase principal ---
+class ThumbnailCache:
+    def __init__(self, max_items=256, persist_dir=None, wrap=None):
+        self.max_items = max_items
+        self.persist_dir = persist_dir # Carpeta de miniaturas en disco (None = solo memoria)
+        self.wrap = wrap # Transforma la miniatura antes de guardarla (p. ej. en un CTkImage)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    def get(self, path, size):
+        """Devuelve la miniatura de path a size (ya pasada por wrap) o None si no se puede leer."""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        key = (os.path.abspath(path), tuple(size), mtime) # Si la imagen cambia, cambia la clave
+
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+
+        try:
+            thumb = self._load(key[0], tuple(size), mtime)
+        except Exception as e:
+            print(f"Error en ThumbnailCache: {e}")
+            return None
+        value = self.wrap(thumb) if self.wrap else thumb
+
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return value
+
+    def _load(self, path, size, mtime):
+        if not self.persist_dir:
+            return load_thumbnail(path, size)
+
+        name = hashlib.blake2b(path.encode("utf-8"), digest_size=8).hexdigest()
+        cached = os.path.join(self.persist_dir, f"{name}_{size[0]}x{size[1]}.png")
+        if os.path.exists(cached) and os.path.getmtime(cached) >= mtime:
+            with Image.open(cached) as img:
+                return img.copy()
+
+        thumb = load_thumbnail(path, size)
+        thumb.save(cached)
+        return thumb
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
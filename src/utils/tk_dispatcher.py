@@ -0,0 +1,48 @@
+""" **************************
+    ***   TK_DISPATCHER.PY   ***
+    ************************** """
+# Este archivo contiene la clase TkDispatcher: lleva al hilo de Tk las funciones que los hilos de
+# trabajo quieren ejecutar sobre la interfaz (Tk no admite tocar widgets desde otros hilos).
+
+# --- Importaciones ---
+import queue
+
+# --- Clase principal ---
+class TkDispatcher:
+    """
+    Cola de llamadas pendientes que el hilo de Tk vacía periódicamente con after().
+    Se crea desde el hilo de Tk; después se puede llamar desde cualquier hilo:
+        dispatcher(funcion, *args)
+    """
+    def __init__(self, widget, interval_ms=30):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self._pending = queue.SimpleQueue()
+        self._stopped = False
+        self._job = self.widget.after(self.interval_ms, self._drain)
+
+    def __call__(self, fn, *args):
+        if self._stopped: # La vista ya no existe: la llamada se descarta
+            return
+        self._pending.put((fn, args))
+
+    def _drain(self):
+        while True:
+            try:
+                fn, args = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Error en TkDispatcher: {e}")
+        # Una de las llamadas pudo destruir la vista (p. ej. cerrar sesión): entonces no se reprograma
+        self._job = None if self._stopped else self.widget.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        """Detiene el sondeo (p. ej. al destruir la vista) y descarta las llamadas pendientes."""
+        self._stopped = True
+        self._pending = queue.SimpleQueue()
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
@@ -7,7 +7,10 @@
 # --- Importaciones ---
 import customtkinter as ctk
 import os
+import threading
 from src.models.database import db
+from src.views.virtual_list import VirtualList
+from src.utils.tk_dispatcher import TkDispatcher
 from tkinter import messagebox, filedialog
 
 # --- Clase principal ---
@@ -16,9 +19,15 @@ class AdminPage(ctk.CTkFrame):
         super().__init__(master, fg_color="transparent")
         self.on_logout = on_logout
         self.controller = controller
+        self.dispatcher = TkDispatcher(self) # Resultados de la importación (hilo de trabajo) -> hilo de Tk
         
         self.setup_ui()
 
+    def destroy(self):
+        # Al cerrar sesión se detiene el sondeo: una importación en curso ya no tiene vista que actualizar
+        self.dispatcher.stop()
+        super().destroy()
+
     # --- Función de configuración de la interfaz ---
     def setup_ui(self):
         # Barra superior redondeada
@@ -60,93 +69,165 @@ class AdminPage(ctk.CTkFrame):
         )
         self.btn_add.pack(side="left", padx=10)
 
-        self.scroll_frame = ctk.CTkScrollableFrame(self.tab_species, corner_radius=15)
-        self.scroll_frame.pack(fill="both", expand=True, padx=40, pady=20)
+        # Importación / exportación masiva del catálogo
+        self.btn_import = ctk.CTkButton(
+            self.actions_frame, text="Importar Catálogo", corner_radius=20, height=40, width=140,
+            fg_color="#004d4d", command=self.import_catalogue
+        )
+        self.btn_import.pack(side="left", padx=5)
+
+        self.btn_export = ctk.CTkButton(
+            self.actions_frame, text="Exportar", corner_radius=20, height=40, width=100,
+            fg_color="#2B2B2B", command=self.export_catalogue
+        )
+        self.btn_export.pack(side="left", padx=5)
+
+        # Búsqueda de texto completo (nombre, descripción o rasgos)
+        self.search_entry = ctk.CTkEntry(self.actions_frame, placeholder_text="Buscar especie o rasgo...", width=250, height=40, corner_radius=20)
+        self.search_entry.pack(side="right", padx=10)
+        self.search_entry.bind("<Return>", lambda e: self.load_species())
+
+        # Lista virtual: solo existen los widgets de las filas visibles
+        self.species_list = VirtualList(
+            self.tab_species, fetch_page=self.controller.get_species_page, count=self.controller.count_species,
+            make_row=self._make_species_row, fill_row=self._fill_species_row, corner_radius=15
+        )
+        self.species_list.pack(fill="both", expand=True, padx=40, pady=20)
         
         # --- SECCIÓN USUARIOS ---
         self.title_users = ctk.CTkLabel(self.tab_users, text="Usuarios Registrados en el Sistema", font=("Segoe UI", 20, "bold"))
         self.title_users.pack(pady=10)
 
-        self.users_scroll = ctk.CTkScrollableFrame(self.tab_users, corner_radius=15)
-        self.users_scroll.pack(fill="both", expand=True, padx=40, pady=20)
+        self.users_list = VirtualList(
+            self.tab_users, fetch_page=self.controller.get_users_page, count=self.controller.count_users,
+            make_row=self._make_user_row, fill_row=self._fill_user_row, corner_radius=15
+        )
+        self.users_list.pack(fill="both", expand=True, padx=40, pady=20)
 
         self.load_species()
         self.load_users()
 
     def load_users(self):
-        # Limpiar lista anterior
-        for widget in self.users_scroll.winfo_children():
-            widget.destroy()
-            
-        users_data = self.controller.get_all_users()
-        for u in users_data:
-            u_id, u_name, u_role = u
-            item = ctk.CTkFrame(self.users_scroll, corner_radius=10, fg_color="#1a1a1a")
-            item.pack(fill="x", pady=5, padx=5)
-            
-            icon = "👤" if u_role == "user" else "🔑"
-            color = "white" if u_role == "user" else "cyan"
-            
-            ctk.CTkLabel(item, text=f"{icon} {u_name}", font=("Segoe UI", 14, "bold"), text_color=color).pack(side="left", padx=15, pady=10)
-            ctk.CTkLabel(item, text=f"Rol: {u_role.upper()}", font=("Segoe UI", 11)).pack(side="left", padx=20)
-            
-            if u_name != "admin": # No se puede borrar al superadmin
-                btn_del_user = ctk.CTkButton(
-                    item, text="Eliminar", width=80, corner_radius=10, fg_color="#440000",
-                    command=lambda name=u_name: self.confirm_delete_user(name)
-                )
-                btn_del_user.pack(side="right", padx=10)
-
-    def confirm_delete_user(self, username):
+        self.users_list.reset()
+
+    # --- Filas de la lista de usuarios (se reutilizan al desplazarse) ---
+    def _make_user_row(self, parent):
+        item = ctk.CTkFrame(parent, corner_radius=10, fg_color="#1a1a1a")
+        row = {
+            "frame": item,
+            "name": ctk.CTkLabel(item, text="", font=("Segoe UI", 14, "bold")),
+            "role": ctk.CTkLabel(item, text="", font=("Segoe UI", 11)),
+            "delete": ctk.CTkButton(item, text="Eliminar", width=80, corner_radius=10, fg_color="#440000")
+        }
+        row["name"].pack(side="left", padx=15, pady=10)
+        row["role"].pack(side="left", padx=20)
+        return row
+
+    def _fill_user_row(self, row, u):
+        u_id, u_name, u_role = u
+        icon = "👤" if u_role == "user" else "🔑"
+        color = "white" if u_role == "user" else "cyan"
+
+        row["name"].configure(text=f"{icon} {u_name}", text_color=color)
+        row["role"].configure(text=f"Rol: {u_role.upper()}")
+
+        if u_name != "admin": # No se puede borrar al superadmin
+            row["delete"].configure(command=lambda id=u_id, name=u_name: self.confirm_delete_user(name, id))
+            row["delete"].pack(side="right", padx=10)
+        else:
+            row["delete"].pack_forget()
+
+    def confirm_delete_user(self, username, user_id=None):
         if messagebox.askyesno("Confirmar", f"¿Seguro que desea eliminar al usuario '{username}'?"):
             if self.controller.delete_user(username):
                 messagebox.showinfo("Éxito", "Usuario eliminado")
-                self.load_users()
+                if user_id is None:
+                    self.load_users()
+                else:
+                    self.users_list.remove_item(user_id)
             else:
                 messagebox.showerror("Error", "No se pudo eliminar")
 
     # --- Función de carga de especies ---
     def load_species(self):
-        # Limpiar lista anterior
-        for widget in self.scroll_frame.winfo_children():
-            widget.destroy()
-            
-        species_data = self.controller.get_all_species()
-        for s in species_data:
-            species_id = s[0]
-            item = ctk.CTkFrame(self.scroll_frame, corner_radius=10, fg_color="#1a1a1a")
-            item.pack(fill="x", pady=5, padx=5)
-            
-            ctk.CTkLabel(item, text=f"🧬 {s[1]} {s[2]}", font=("Segoe UI", 16, "bold"), text_color="cyan").pack(side="left", padx=15, pady=10)
-            ctk.CTkLabel(item, text=f"Nombre común: {s[3]}", font=("Segoe UI", 12)).pack(side="left", padx=20)
-            
+        query = self.search_entry.get().strip()
+        if query:
+            # La búsqueda devuelve una sola página ordenada por relevancia
+            self.species_list.reset(lambda after_id, limit: self.controller.search_species(query) if not after_id else [])
+        else:
+            self.species_list.reset(self.controller.get_species_page, self.controller.count_species)
+
+    # --- Filas de la lista de especies (se reutilizan al desplazarse) ---
+    def _make_species_row(self, parent):
+        item = ctk.CTkFrame(parent, corner_radius=10, fg_color="#1a1a1a")
+        row = {
+            "frame": item,
+            "name": ctk.CTkLabel(item, text="", font=("Segoe UI", 16, "bold"), text_color="cyan"),
+            "common": ctk.CTkLabel(item, text="", font=("Segoe UI", 12)),
             # Botones de Editar y Eliminar
-            btn_delete = ctk.CTkButton(
-                item, 
-                text="Eliminar", 
-                width=80, 
-                corner_radius=10, 
-                fg_color="#330000",
-                command=lambda id=species_id: self.confirm_delete(id)
-            )
-            btn_delete.pack(side="right", padx=10)
-
-            btn_edit = ctk.CTkButton(
-                item, 
-                text="Editar", 
-                width=80, 
-                corner_radius=10, 
-                fg_color="#004d4d",
-                command=lambda data=s: self.show_edit_dialog(data)
-            )
-            btn_edit.pack(side="right", padx=5)
+            "delete": ctk.CTkButton(item, text="Eliminar", width=80, corner_radius=10, fg_color="#330000"),
+            "edit": ctk.CTkButton(item, text="Editar", width=80, corner_radius=10, fg_color="#004d4d")
+        }
+        row["name"].pack(side="left", padx=15, pady=10)
+        row["common"].pack(side="left", padx=20)
+        row["delete"].pack(side="right", padx=10)
+        row["edit"].pack(side="right", padx=5)
+        return row
+
+    def _fill_species_row(self, row, s):
+        species_id = s[0]
+        row["name"].configure(text=f"🧬 {s[1]} {s[2]}")
+        row["common"].configure(text=f"Nombre común: {s[3]}")
+        row["delete"].configure(command=lambda id=species_id: self.confirm_delete(id))
+        row["edit"].configure(command=lambda id=species_id: self.show_edit_dialog(self.controller.get_species(id)))
+
+    # --- Importación y exportación masiva ---
+    def import_catalogue(self):
+        path = filedialog.askopenfilename(filetypes=[("Catálogo", "*.csv *.json *.jsonl")])
+        if not path:
+            return
+        self.btn_import.configure(state="disabled", text="Importando...")
+
+        def run_import():
+            report = self.controller.import_species(path)
+            self.dispatcher(self._import_finished, report)
+
+        # Miles de especies e imágenes: se trabaja fuera del hilo de Tk
+        threading.Thread(target=run_import, daemon=True).start()
+
+    def _import_finished(self, report):
+        self.btn_import.configure(state="normal", text="Importar Catálogo")
+        if report["status"] != "success":
+            messagebox.showerror("Error", report["message"])
+            return
+
+        summary = f"Especies importadas: {report['inserted']}\nOmitidas (ya existían): {report['skipped']}"
+        issues = report["errors"] + report["warnings"]
+        if issues:
+            summary += f"\n\nAvisos ({len(issues)}):\n" + "\n".join(issues[:10])
+            if len(issues) > 10:
+                summary += f"\n... y {len(issues) - 10} más"
+        messagebox.showinfo("Importación", summary)
+        self.species_list.load_new()
+
+    def export_catalogue(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".csv", filetypes=[("CSV", "*.csv"), ("JSON", "*.json"), ("JSON Lines", "*.jsonl")]
+        )
+        if not path:
+            return
+        try:
+            count = self.controller.export_species(path)
+            messagebox.showinfo("Exportación", f"Especies exportadas: {count}\n{os.path.basename(path)}")
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo exportar: {e}")
 
     # --- Función de confirmación de eliminación ---
     def confirm_delete(self, species_id):
         if messagebox.askyesno("Confirmar", "¿Seguro que desea eliminar esta especie?"):
             if self.controller.delete_species(species_id):
                 messagebox.showinfo("Éxito", "Especie eliminada")
-                self.load_species()
+                self.species_list.remove_item(species_id)
             else:
                 messagebox.showerror("Error", "No se pudo eliminar")
 
@@ -278,7 +359,13 @@ class AdminPage(ctk.CTkFrame):
 
             if success:
                 messagebox.showinfo("Éxito", "Especie guardada correctamente")
-                self.load_species()
+                if data:
+                    # Solo se redibuja la fila editada
+                    updated = self.controller.get_species(data[0])
+                    if updated:
+                        self.species_list.update_item(data[0], updated[:4])
+                else:
+                    self.species_list.load_new()
                 dialog.destroy()
             else:
                 messagebox.showerror("Error", "Error al guardar en base de datos")
@@ -6,8 +6,16 @@
 # --- Importaciones ---
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-from PIL import Image
 import os
+from src.utils.tk_dispatcher import TkDispatcher
+from src.utils.thumbnail_cache import ThumbnailCache, load_thumbnail
+
+# --- Constantes ---
+DEBOUNCE_MS = 250 # Espera tras el último cambio de selector antes de lanzar la inferencia
+RESULTS_PAGE = 20 # Tarjetas de resultado que se dibujan por página ("Mostrar más")
+THUMB_SIZE = (70, 70)
+PREVIEW_SIZE = (360, 360)
+THUMBS_DIR = os.path.join(os.getcwd(), "assets", "species_images", ".thumbs")
 
 # --- Clase principal ---
 class UserPage(ctk.CTkFrame):
@@ -15,6 +23,17 @@ class UserPage(ctk.CTkFrame):
         super().__init__(master, fg_color="transparent")
         self.on_logout = on_logout
         self.controller = controller
+        self.dispatcher = TkDispatcher(self) # Resultados de los hilos de trabajo -> hilo de Tk
+        self._refresh_job = None # after() pendiente del debounce de los selectores
+        # Miniaturas de referencia ya convertidas a CTkImage (LRU en memoria + copia en disco)
+        self.thumbnails = ThumbnailCache(
+            max_items=256, persist_dir=THUMBS_DIR,
+            wrap=lambda img: ctk.CTkImage(light_image=img, size=img.size)
+        )
+        self._cards = [] # Tarjetas de resultado reutilizables (se actualizan en lugar de recrearse)
+        self._results = []
+        self._shown = 0
+        self.img_label = None
         
         self.setup_ui()
 
@@ -47,19 +66,19 @@ class UserPage(ctk.CTkFrame):
         traits_grid.pack(pady=10)
 
         ctk.CTkLabel(traits_grid, text="Forma Caparazón:", font=("Segoe UI", 12)).grid(row=0, column=0, sticky="w", padx=10, pady=5)
-        self.opt_shape = ctk.CTkOptionMenu(traits_grid, width=200, values=["no observado", "ovalado", "subcilindrico", "redondeado"], command=lambda x: self.refresh_identification())
+        self.opt_shape = ctk.CTkOptionMenu(traits_grid, width=200, values=["no observado", "ovalado", "subcilindrico", "redondeado"], command=lambda x: self.schedule_identification())
         self.opt_shape.grid(row=0, column=1, pady=5, padx=10)
 
         ctk.CTkLabel(traits_grid, text="Superficie:", font=("Segoe UI", 12)).grid(row=1, column=0, sticky="w", padx=10, pady=5)
-        self.opt_surf = ctk.CTkOptionMenu(traits_grid, width=200, values=["no observado", "liso", "rugoso", "estriado"], command=lambda x: self.refresh_identification())
+        self.opt_surf = ctk.CTkOptionMenu(traits_grid, width=200, values=["no observado", "liso", "rugoso", "estriado"], command=lambda x: self.schedule_identification())
         self.opt_surf.grid(row=1, column=1, pady=5, padx=10)
 
         ctk.CTkLabel(traits_grid, text="Dáctilo (Pata):", font=("Segoe UI", 12)).grid(row=2, column=0, sticky="w", padx=10, pady=5)
-        self.opt_dact = ctk.CTkOptionMenu(traits_grid, width=200, values=["no observado", "recto", "falcado"], command=lambda x: self.refresh_identification())
+        self.opt_dact = ctk.CTkOptionMenu(traits_grid, width=200, values=["no observado", "recto", "falcado"], command=lambda x: self.schedule_identification())
         self.opt_dact.grid(row=2, column=1, pady=5, padx=10)
 
         ctk.CTkLabel(traits_grid, text="Talla Estimada:", font=("Segoe UI", 12)).grid(row=3, column=0, sticky="w", padx=10, pady=5)
-        self.opt_size = ctk.CTkOptionMenu(traits_grid, width=200, values=["no observado", "pequeño", "mediano", "grande"], command=lambda x: self.refresh_identification())
+        self.opt_size = ctk.CTkOptionMenu(traits_grid, width=200, values=["no observado", "pequeño", "mediano", "grande"], command=lambda x: self.schedule_identification())
         self.opt_size.grid(row=3, column=1, pady=5, padx=10)
  
         self.fb_label = ctk.CTkLabel(self.center_col, text="Complete los rasgos para iniciar la inferencia", text_color="cyan", font=("Segoe UI", 12, "italic"))
@@ -67,6 +86,9 @@ class UserPage(ctk.CTkFrame):
 
         self.results_scroll = ctk.CTkFrame(self.center_col, corner_radius=15, fg_color="transparent")
         self.results_scroll.pack(fill="x", padx=40, pady=10)
+
+        self.empty_label = ctk.CTkLabel(self.results_scroll, text="No se encontraron coincidencias exactas.\nIntenta variar los rasgos observados.", font=("Segoe UI", 12, "italic"), text_color="gray")
+        self.btn_more = ctk.CTkButton(self.results_scroll, text="Mostrar más", height=30, corner_radius=15, fg_color="#2B2B2B", command=self.show_more_results)
  
         # --- Sección de Orientador IA ---
         self.ai_frame = ctk.CTkFrame(self.center_col, corner_radius=15, border_width=1, border_color="#004d4d")
@@ -156,20 +178,20 @@ class UserPage(ctk.CTkFrame):
 
         self.controller.set_ai_api_key(api_key)
         self.controller.save_api_key(api_key) # Guardar permanentemente
+
+        # Pool acotado de IA: la respuesta llega por fragmentos al hilo de Tk
+        results = getattr(self, 'current_full_results', None)
+        _, started = self.controller.ask_ai_async(
+            question, results, on_chunk=self.append_ai_output, dispatcher=self.dispatcher
+        )
+        self.ai_question_entry.delete(0, "end")
+        if not started:
+            return # La misma pregunta ya se está respondiendo
         
         # Mostrar pregunta en el box
         self.ai_output.insert("end", f"\n\n👤 Estudiante: {question}")
+        self.ai_output.insert("end", "\n\n🤖 Experto: ")
         self.ai_output.see("end")
-        self.ai_question_entry.delete(0, "end")
-        
-        def do_chat():
-            results = getattr(self, 'current_full_results', None)
-            answer = self.controller.chat_with_ai(question, results)
-            self.ai_output.insert("end", f"\n\n🤖 Experto: {answer}")
-            self.ai_output.see("end")
-
-        import threading
-        threading.Thread(target=do_chat).start()
 
     def consult_ai(self):
         """Envía el contexto actual a Gemini para obtener una explicación."""
@@ -180,20 +202,36 @@ class UserPage(ctk.CTkFrame):
 
         self.controller.set_ai_api_key(api_key)
         self.controller.save_api_key(api_key) # Guardar permanentemente
-        self.ai_output.delete("0.0", "end")
-        self.ai_output.insert("0.0", "Consultando al experto... 🧠")
-        
-        def run_ai_query():
-            explanation = self.controller.get_ai_explanation(self.current_full_results)
+
+        waiting = {"active": True}
+        def on_chunk(chunk):
+            if waiting["active"]:
+                # El primer fragmento reemplaza el mensaje de espera
+                self.ai_output.delete("0.0", "end")
+                waiting["active"] = False
+            self.append_ai_output(chunk)
+
+        _, started = self.controller.explain_ai_async(
+            getattr(self, 'current_full_results', None), on_chunk=on_chunk, dispatcher=self.dispatcher
+        )
+        if started:
             self.ai_output.delete("0.0", "end")
-            self.ai_output.insert("0.0", explanation)
+            self.ai_output.insert("0.0", "Consultando al experto... 🧠")
 
-        # Ejecutamos en un thread pequeño para no congelar la UI si tarda
-        import threading
-        threading.Thread(target=run_ai_query).start()
+    def schedule_identification(self):
+        """Agrupa cambios rápidos de los selectores: solo se infiere tras DEBOUNCE_MS sin cambios."""
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+        self._refresh_job = self.after(DEBOUNCE_MS, self.refresh_identification)
+
+    def append_ai_output(self, text):
+        """Añade texto al final del cuadro del experto (solo desde el hilo de Tk)."""
+        self.ai_output.insert("end", text)
+        self.ai_output.see("end")
 
     def refresh_identification(self):
         """Vuelve a ejecutar el motor experto sumando los rasgos seleccionados en los menús."""
+        self._refresh_job = None
         selected_traits = []
         
         # Recolectar solo lo que no sea "no observado"
@@ -203,15 +241,33 @@ class UserPage(ctk.CTkFrame):
         if self.opt_size.get() != "no observado": selected_traits.append(self.opt_size.get())
         
         if not selected_traits:
+            self.controller.cancel_identification()
             self.fb_label.configure(text="Seleccione al menos un rasgo", text_color="yellow")
             return
 
-        # Llamar al motor experto a través del controlador
-        res_list = self.controller.identify_by_manual_selection(selected_traits)
-        self.current_full_results = res_list
-        self.btn_export.configure(state="normal" if res_list else "disabled")
+        # Llamar al motor experto en un hilo de trabajo; una petición nueva reemplaza a la anterior
+        self.fb_label.configure(text="Calculando probabilidades...", text_color="cyan")
+        self.controller.identify_by_manual_selection_async(
+            selected_traits, on_done=self.apply_identification, dispatcher=self.dispatcher
+        )
+
+    def apply_identification(self, data):
+        """Aplica en la interfaz el resultado de la última petición (ya en el hilo de Tk)."""
+        if data["status"] == "success":
+            res_list = data["results"]
+            self.current_full_results = res_list
+            self.btn_export.configure(state="normal" if res_list else "disabled")
         
-        self.display_results({"status": "success", "results": res_list})
+        self.display_results(data)
+
+    def destroy(self):
+        # Al cerrar sesión se descartan la inferencia en curso y el sondeo del despachador
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+        self.controller.cancel_identification()
+        self.controller.cancel_ai()
+        self.dispatcher.stop()
+        super().destroy()
 
     def export_pdf(self):
         if hasattr(self, 'current_full_results'):
@@ -227,53 +283,92 @@ class UserPage(ctk.CTkFrame):
         path = filedialog.askopenfilename(filetypes=[("Imágenes", "*.jpg *.png *.jpeg")])
         if path:
             self.current_ref_path = path
-            my_image = ctk.CTkImage(light_image=Image.open(path), size=(360, 360))
+            # Vista previa decodificada a tamaño reducido (la foto original puede tener decenas de MP)
+            preview = load_thumbnail(path, PREVIEW_SIZE)
+            my_image = ctk.CTkImage(light_image=preview, size=preview.size)
+            if self.img_label is None:
+                self.img_label = ctk.CTkLabel(self.center_col, text="")
+                self.img_label.pack(after=self.fb_label, pady=10)
             self.img_label.configure(image=my_image, text="")
             self.fb_label.configure(text="Imagen cargada como referencia", text_color="cyan")
 
     # -- Función de mostrar resultados --
     def display_results(self, data):
-        for widget in self.results_scroll.winfo_children():
-            widget.destroy()
-            
-        if data["status"] == "success":
-            results = data.get("results", [])
-            
-            if not results:
-                ctk.CTkLabel(self.results_scroll, text="No se encontraron coincidencias exactas.\nIntenta variar los rasgos observados.", font=("Segoe UI", 12, "italic"), text_color="gray").pack(pady=20)
-                return
+        self._results = data.get("results", []) if data["status"] == "success" else []
+        self._shown = 0
+        if data["status"] != "success" or not self._results:
+            self._hide_cards(0)
+            self.btn_more.pack_forget()
+            if data["status"] != "success":
+                self.empty_label.pack_forget()
+                self.fb_label.configure(text=data["message"], text_color="red")
+            else:
+                self.empty_label.pack(pady=20)
+            return
 
-            # Actualizar label de estado
-            self.fb_label.configure(text=f"Resultados encontrados: {len(results)}", text_color="cyan")
-            
-            for r in results:
-                card = ctk.CTkFrame(self.results_scroll, corner_radius=12, fg_color="#1a1a1a")
-                card.pack(fill="x", pady=5, padx=5)
-                
-                content_frame = ctk.CTkFrame(card, fg_color="transparent")
-                content_frame.pack(fill="x", padx=10, pady=10)
-
-                # Info textual
-                info_frame = ctk.CTkFrame(content_frame, fg_color="transparent")
-                info_frame.pack(side="left", fill="both", expand=True)
-                
-                ctk.CTkLabel(info_frame, text=f"{r['genus']} {r['species']}", font=("Segoe UI", 14, "bold"), text_color="cyan").pack(anchor="w")
-                ctk.CTkLabel(info_frame, text=f"Nombre común: {r['common_name']}", font=("Segoe UI", 11)).pack(anchor="w")
-                ctk.CTkLabel(info_frame, text=f"Confianza diagnóstica: {r['probability']}%", font=("Segoe UI", 10)).pack(anchor="w")
-                
-                prog = ctk.CTkProgressBar(info_frame, width=150)
-                prog.pack(pady=5, anchor="w")
-                prog.set(r['probability']/100)
+        self.empty_label.pack_forget()
+        # Actualizar label de estado
+        self.fb_label.configure(text=f"Resultados encontrados: {len(self._results)}", text_color="cyan")
+        self.show_more_results()
 
-                # Imagen de referencia
-                if r.get("ref_image"):
-                    abs_path = os.path.join(os.getcwd(), r["ref_image"])
-                    if os.path.exists(abs_path):
-                        from PIL import Image
-                        try:
-                            ref_img_ctk = ctk.CTkImage(Image.open(abs_path), size=(70, 70))
-                            ctk.CTkLabel(content_frame, image=ref_img_ctk, text="").pack(side="right")
-                        except:
-                            pass
+    def show_more_results(self):
+        """Dibuja la siguiente página de tarjetas reutilizando las que ya existen."""
+        end = min(self._shown + RESULTS_PAGE, len(self._results))
+        if self._shown == 0:
+            self._hide_cards(end)
+        for i in range(self._shown, end):
+            self._fill_card(self._get_card(i), self._results[i])
+        self._shown = end
+
+        self.btn_more.pack_forget()
+        remaining = len(self._results) - end
+        if remaining > 0:
+            self.btn_more.configure(text=f"Mostrar más ({remaining} restantes)")
+            self.btn_more.pack(pady=10)
+
+    def _hide_cards(self, keep):
+        for card in self._cards[keep:]:
+            card["frame"].pack_forget()
+
+    def _get_card(self, i):
+        if i < len(self._cards):
+            card = self._cards[i]
         else:
-            self.fb_label.configure(text=data["message"], text_color="red")
+            frame = ctk.CTkFrame(self.results_scroll, corner_radius=12, fg_color="#1a1a1a")
+            content_frame = ctk.CTkFrame(frame, fg_color="transparent")
+            content_frame.pack(fill="x", padx=10, pady=10)
+
+            # Info textual
+            info_frame = ctk.CTkFrame(content_frame, fg_color="transparent")
+            info_frame.pack(side="left", fill="both", expand=True)
+
+            card = {
+                "frame": frame,
+                "name": ctk.CTkLabel(info_frame, text="", font=("Segoe UI", 14, "bold"), text_color="cyan"),
+                "common": ctk.CTkLabel(info_frame, text="", font=("Segoe UI", 11)),
+                "confidence": ctk.CTkLabel(info_frame, text="", font=("Segoe UI", 10)),
+                "progress": ctk.CTkProgressBar(info_frame, width=150),
+                # Imagen de referencia
+                "image": ctk.CTkLabel(content_frame, text="", width=THUMB_SIZE[0])
+            }
+            card["name"].pack(anchor="w")
+            card["common"].pack(anchor="w")
+            card["confidence"].pack(anchor="w")
+            card["progress"].pack(pady=5, anchor="w")
+            card["image"].pack(side="right")
+            self._cards.append(card)
+
+        if not card["frame"].winfo_manager():
+            card["frame"].pack(fill="x", pady=5, padx=5, before=self.btn_more if self.btn_more.winfo_manager() else None)
+        return card
+
+    def _fill_card(self, card, r):
+        card["name"].configure(text=f"{r['genus']} {r['species']}")
+        card["common"].configure(text=f"Nombre común: {r['common_name']}")
+        card["confidence"].configure(text=f"Confianza diagnóstica: {r['probability']}%")
+        card["progress"].set(r['probability']/100)
+
+        thumb = None
+        if r.get("ref_image"):
+            thumb = self.thumbnails.get(os.path.join(os.getcwd(), r["ref_image"]), THUMB_SIZE)
+        card["image"].configure(image=thumb if thumb is not None else "") # "" borra la imagen anterior
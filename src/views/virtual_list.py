@@ -0,0 +1,152 @@
+""" ************************** 
+    ***    VIRTUAL LIST    *** 
+    ************************** """
+# Este archivo contiene la clase VirtualList: una lista con desplazamiento que solo crea los widgets
+# de las filas visibles y pide los datos a la base por páginas a medida que el usuario se desplaza.
+
+# --- Importaciones ---
+import math
+import tkinter
+import customtkinter as ctk
+
+# --- Constantes ---
+WHEEL_EVENTS = ("<MouseWheel>", "<Button-4>", "<Button-5>") # Windows/macOS y X11
+
+# --- Clase principal ---
+class VirtualList(ctk.CTkFrame):
+    """
+    fetch_page(after_key, limit) -> lista de tuplas cuya clave es item[0] (paginación por clave).
+    make_row(parent) -> dict con al menos "frame"; fill_row(row, item) vuelca un item en una fila.
+    count() (opcional) -> total de filas, para dimensionar la barra antes de cargarlo todo.
+    """
+    def __init__(self, master, fetch_page, make_row, fill_row, count=None, row_height=56, page_size=200, **kwargs):
+        super().__init__(master, **kwargs)
+        self.fetch_page = fetch_page
+        self.make_row = make_row
+        self.fill_row = fill_row
+        self.count = count
+        self.row_height = row_height
+        self.page_size = page_size
+
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y", pady=5)
+
+        self.items = [] # Filas ya traídas de la base, en orden
+        self._keys = [] # item[0] de cada fila (para las actualizaciones puntuales)
+        self._rows = [] # Widgets reutilizables: solo tantos como filas caben en pantalla
+        self._first = 0 # Índice de la primera fila visible
+        self._total = 0
+        self._exhausted = False
+
+        self.body.bind("<Configure>", lambda e: self._render())
+        # La rueda se escucha en los widgets de la propia lista (las filas se añaden al crearlas):
+        # los enlaces desaparecen con ellos y no quedan manejadores globales tras destruir la lista
+        self._bind_wheel(self)
+
+    # --- Carga de datos ---
+    def reset(self, fetch_page=None, count=None):
+        """Descarta lo cargado y vuelve al principio (p. ej. al cambiar la búsqueda)."""
+        if fetch_page is not None:
+            self.fetch_page = fetch_page
+            self.count = count
+        self.items, self._keys = [], []
+        self._first = 0
+        self._exhausted = False
+        self._total = self.count() if self.count else 0
+        self._fetch_next()
+        self._render()
+
+    def _fetch_next(self):
+        page = self.fetch_page(self._keys[-1] if self._keys else 0, self.page_size)
+        self.items.extend(page)
+        self._keys.extend(item[0] for item in page)
+        if len(page) < self.page_size:
+            self._exhausted = True
+
+    def _ensure_loaded(self, n):
+        while len(self.items) < n and not self._exhausted:
+            self._fetch_next()
+
+    # --- Cambios puntuales (sin reconstruir la lista) ---
+    def update_item(self, key, item):
+        if key in self._keys:
+            self.items[self._keys.index(key)] = item
+            self._render()
+
+    def remove_item(self, key):
+        if key in self._keys:
+            i = self._keys.index(key)
+            del self.items[i]
+            del self._keys[i]
+            self._total = max(self._total - 1, 0)
+            self._render()
+
+    def load_new(self):
+        """Trae las filas posteriores a la última cargada (p. ej. tras añadir un registro)."""
+        if self._exhausted:
+            self._exhausted = False
+            self._fetch_next()
+        if self.count:
+            self._total = self.count()
+        self._render()
+
+    # --- Dibujo ---
+    def _scaling(self):
+        return ctk.ScalingTracker.get_widget_scaling(self)
+
+    def _visible_count(self):
+        height = self.body.winfo_height() / self._scaling()
+        return max(1, math.ceil(height / self.row_height))
+
+    def _render(self):
+        n = self._visible_count()
+        self._ensure_loaded(self._first + 2 * n) # Una pantalla de margen por delante
+        self._first = max(0, min(self._first, len(self.items) - n))
+
+        while len(self._rows) < n:
+            row = self.make_row(self.body)
+            self._bind_wheel(row["frame"])
+            self._rows.append(row)
+
+        for i, row in enumerate(self._rows):
+            idx = self._first + i
+            if i < n and idx < len(self.items):
+                self.fill_row(row, self.items[idx])
+                row["frame"].place(x=0, y=i * self.row_height, relwidth=1, height=self.row_height - 6)
+            else:
+                row["frame"].place_forget()
+
+        total = max(self._total, len(self.items), 1)
+        self.scrollbar.set(self._first / total, min(1.0, (self._first + n) / total))
+
+    # --- Desplazamiento ---
+    def scroll_to(self, index):
+        self._first = max(0, int(index))
+        self._render()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        n = self._visible_count()
+        if action == "moveto":
+            total = max(self._total, len(self.items))
+            self.scroll_to(float(value) * total)
+        elif action == "scroll":
+            step = n if unit == "pages" else 1
+            self.scroll_to(self._first + int(value) * step)
+
+    def _bind_wheel(self, widget):
+        """Enlaza la rueda en widget y en todos sus descendientes (los hijos tapan al contenedor)."""
+        if widget is self.scrollbar: # La barra ya gestiona su propia rueda
+            return
+        for sequence in WHEEL_EVENTS:
+            # Enlace de Tk directo: los widgets de CustomTkinter solo lo reenvían a su lienzo
+            tkinter.Misc.bind(widget, sequence, self._on_wheel, add="+")
+        for child in widget.winfo_children():
+            self._bind_wheel(child)
+
+    def _on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self._first - 3)
+        else:
+            self.scroll_to(self._first + 3)
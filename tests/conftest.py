@@ -0,0 +1,19 @@
+""" ************************** 
+    ***   PYTEST FIXTURES    *** 
+    ************************** """
+# Fixtures compartidas por las pruebas: base de datos y cachés aisladas en un directorio temporal.
+
+# --- Importaciones ---
+import pytest
+
+from src.models import database
+
+# --- Fixtures ---
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Base de datos nueva en tmp_path: la instancia global "db" apunta a ella durante la prueba."""
+    monkeypatch.chdir(tmp_path) # Database y SQLiteCache crean sus archivos en el directorio actual
+    instance = database.Database()
+    monkeypatch.setattr(database, "_db_instance", instance)
+    yield instance
+    instance.close()
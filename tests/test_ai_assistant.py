@@ -0,0 +1,128 @@
+""" ************************** 
+    ***  AI ASSISTANT TEST   *** 
+    ************************** """
+# Pruebas del Orientador IA sin red: StubClient sustituye al cliente de Groq y cuenta las peticiones.
+
+# --- Importaciones ---
+import time
+
+import pytest
+
+from src.utils import ai_assistant
+from src.utils.ai_assistant import AIAssistant, FALLBACK_MODEL, PRIMARY_MODEL
+from src.utils.ai_stub import StubClient
+
+SPECIMEN = ("Emerita analoga", "Cangrejo topo", "ovalado, rugoso")
+
+# --- Fixtures ---
+@pytest.fixture(autouse=True)
+def response_cache(tmp_path, monkeypatch):
+    """Caché de respuestas nueva en tmp_path para cada prueba."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ai_assistant, "_response_cache", None)
+
+def failing_primary(delay=0.0):
+    """Respuesta del stub: el modelo principal falla (tras delay segundos) y el alternativo responde."""
+    def reply(messages, model):
+        if model == PRIMARY_MODEL:
+            time.sleep(delay)
+            raise RuntimeError("modelo principal caído")
+        return f"respuesta de {model}"
+    return reply
+
+# --- Caché de explicaciones ---
+def test_explanation_cache_hit_skips_the_model():
+    client = StubClient(token_delay=0)
+    assistant = AIAssistant(client=client, hedge_after=None)
+    first = assistant.get_taxonomic_explanation(*SPECIMEN)
+    assert assistant.get_taxonomic_explanation(*SPECIMEN) == first
+    assert len(client.calls) == 1
+
+    # La caché es persistente: otra instancia (otra sesión) tampoco llama al modelo
+    other = StubClient(token_delay=0)
+    assert AIAssistant(client=other).get_taxonomic_explanation(*SPECIMEN) == first
+    assert other.calls == []
+
+def test_explanation_cache_depends_on_prompt():
+    client = StubClient(token_delay=0)
+    assistant = AIAssistant(client=client, hedge_after=None)
+    assistant.get_taxonomic_explanation(*SPECIMEN)
+    assistant.get_taxonomic_explanation("Hippa pacifica", "Muy muy", "subcilindrico")
+    assert len(client.calls) == 2
+
+def test_explanation_cache_can_be_disabled():
+    client = StubClient(token_delay=0)
+    assistant = AIAssistant(client=client, use_cache=False, hedge_after=None)
+    assistant.get_taxonomic_explanation(*SPECIMEN)
+    assistant.get_taxonomic_explanation(*SPECIMEN)
+    assert len(client.calls) == 2
+
+# --- Modelo alternativo ---
+def test_explanation_falls_back_when_primary_fails():
+    client = StubClient(reply=failing_primary(), token_delay=0)
+    assistant = AIAssistant(client=client, hedge_after=None)
+    assert assistant.get_taxonomic_explanation(*SPECIMEN) == f"respuesta de {FALLBACK_MODEL}"
+    assert [model for model, _ in client.calls] == [PRIMARY_MODEL, FALLBACK_MODEL]
+
+    # La respuesta del alternativo también queda en caché
+    assert assistant.get_taxonomic_explanation(*SPECIMEN) == f"respuesta de {FALLBACK_MODEL}"
+    assert len(client.calls) == 2
+
+def test_slow_primary_is_hedged_with_fallback():
+    client = StubClient(reply=failing_primary(delay=2.0), token_delay=0)
+    assistant = AIAssistant(client=client, hedge_after=0.05)
+    start = time.perf_counter()
+    assert assistant.chat_query("¿Dónde vive?") == f"respuesta de {FALLBACK_MODEL}"
+    assert time.perf_counter() - start < 1.0
+
+def test_error_message_when_every_model_fails():
+    client = StubClient(reply=lambda messages, model: 1 / 0, token_delay=0)
+    assistant = AIAssistant(client=client, hedge_after=None)
+    assert assistant.get_taxonomic_explanation(*SPECIMEN).startswith("Error en Groq:")
+    assert assistant.get_taxonomic_explanation(*SPECIMEN).startswith("Error en Groq:")
+    assert len(client.calls) == 4 # Los errores no se guardan en la caché
+
+# --- Streaming ---
+def test_streamed_explanation_arrives_in_chunks_and_is_cached():
+    client = StubClient(reply="El telson es lanceolado y el caparazón ovalado.", token_delay=0)
+    assistant = AIAssistant(client=client)
+    chunks = list(assistant.stream_taxonomic_explanation(*SPECIMEN))
+    assert len(chunks) > 1
+    assert "".join(chunks) == client.reply
+
+    # Completada la respuesta, la siguiente llega entera desde la caché y sin pedirla al modelo
+    assert list(assistant.stream_taxonomic_explanation(*SPECIMEN)) == [client.reply]
+    assert assistant.get_taxonomic_explanation(*SPECIMEN) == client.reply
+    assert len(client.calls) == 1
+
+def test_streamed_explanation_falls_back_before_first_chunk():
+    client = StubClient(reply=failing_primary(), token_delay=0)
+    assistant = AIAssistant(client=client)
+    assert "".join(assistant.stream_taxonomic_explanation(*SPECIMEN)) == f"respuesta de {FALLBACK_MODEL}"
+    assert [model for model, _ in client.calls] == [PRIMARY_MODEL, FALLBACK_MODEL]
+
+def test_streamed_chat_matches_full_answer():
+    client = StubClient(token_delay=0)
+    assistant = AIAssistant(client=client, hedge_after=None)
+    chunks = list(assistant.stream_chat_query("¿Qué come Emerita?", "Emerita analoga"))
+    assert len(chunks) > 1
+    assert "".join(chunks) == assistant.chat_query("¿Qué come Emerita?", "Emerita analoga")
+
+def test_stream_without_client_reports_configuration(monkeypatch):
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.delenv("SEITH_AI_BACKEND", raising=False)
+    assistant = AIAssistant()
+    assert list(assistant.stream_chat_query("hola")) == ["Asistente Groq no configurado."]
+
+def test_stream_is_closed_when_consumer_stops_early():
+    client = StubClient(reply="uno dos tres cuatro cinco", token_delay=0)
+    stream = AIAssistant(client=client).stream_taxonomic_explanation(*SPECIMEN)
+    assert next(stream) == "uno"
+    assert not client.streams[0].closed
+    stream.close() # Lo que hace el controlador al descartar una respuesta superada o cancelada
+    assert client.streams[0].closed
+
+def test_stream_is_closed_after_full_read():
+    client = StubClient(token_delay=0)
+    list(AIAssistant(client=client).stream_chat_query("¿Qué come Emerita?"))
+    assert [s.closed for s in client.streams] == [True]
@@ -0,0 +1,141 @@
+""" ************************** 
+    ***  ENGINE PARITY TEST  *** 
+    ************************** """
+# Comprueba que los motores "linear", "indexed" y "vectorized" devuelven exactamente
+# lo mismo que la inferencia original (recorrido completo de las especies).
+
+# --- Importaciones ---
+import itertools
+import json
+import random
+import threading
+
+import pytest
+
+from src.cli import SELECTOR_VALUES
+from src.models.expert_engine import ENGINES, ExpertEngine
+
+# Vocabulario con sinónimos, rasgos compuestos, mayúsculas y espacios para forzar todos los tipos de coincidencia
+VOCABULARY = [
+    "ovalado", "subcilindrico", "redondeado", "cilindrico alargado", "elipsoide", " Ovalado ",
+    "liso", "suave", "sin rugosidad", "rugoso", "rugosa", "caparazon rugoso", "granulado",
+    "estriado", "asperos", "recto", "falcado", "ovalado dactilo", "pequeño", "mediano", "grande", "a",
+]
+N_SPECIES = 300
+
+# --- Inferencia de referencia (implementación original) ---
+def baseline_identify(species_rows, user_features):
+    thesaurus = {
+        "subcilindrico": ["ovalado", "cilindrico", "alargado"],
+        "ovalado": ["subcilindrico", "redondeado", "elipsoide"],
+        "liso": ["suave", "sin rugosidad"],
+        "rugoso": ["granulado", "estriado", "asperos", "rugosa"]
+    }
+    rules = []
+    for s in species_rows:
+        try:
+            features = json.loads(s[5])
+        except:
+            features = s[5].lower().replace(",", " ").split()
+        rules.append({"genus": s[1], "species": s[2], "common_name": s[3], "features": features})
+
+    if isinstance(user_features, str):
+        user_features = [f.strip().lower() for f in user_features.replace(",", " ").split() if f.strip()]
+    else:
+        user_features = [f.lower() for f in user_features if f.lower() != "no observado"]
+    if not user_features: return []
+
+    results = []
+    for rule in rules:
+        score = 0
+        rule_features = [f.strip().lower() for f in rule["features"]]
+        for u_feat in user_features:
+            weight = 1.5 if any(k in u_feat for k in ["rugoso", "falcado", "estriado"]) else 1.0
+            found = False
+            if u_feat in rule_features:
+                score += weight
+                found = True
+            else:
+                for r_feat in rule_features:
+                    if u_feat in r_feat or r_feat in u_feat:
+                        score += weight
+                        found = True
+                        break
+            if not found and u_feat in thesaurus:
+                for syn in thesaurus[u_feat]:
+                    if any(syn in r_f for r_f in rule_features):
+                        score += (weight * 0.7)
+                        found = True
+                        break
+        if score > 0:
+            probability = min((score / len(user_features)) * 100, 100)
+            results.append({
+                "genus": rule["genus"],
+                "species": rule["species"],
+                "common_name": rule["common_name"],
+                "probability": round(probability, 2)
+            })
+    return sorted(results, key=lambda x: x["probability"], reverse=True)
+
+def _comparable(results):
+    return [(r["genus"], r["species"], r["common_name"], r["probability"]) for r in results]
+
+# --- Fixtures ---
+@pytest.fixture
+def seeded_db(temp_db):
+    """Base con especies aleatorias: la mitad con rasgos en JSON y la otra mitad como texto separado por comas."""
+    rng = random.Random(1)
+    for i in range(N_SPECIES):
+        features = rng.sample(VOCABULARY, rng.randint(0, 5))
+        text = json.dumps(features) if i % 2 else ", ".join(features)
+        temp_db.add_species(f"Genus{i % 40}", f"sp{i}", f"Común {i}", "", text, f"img{i}.png")
+    return temp_db
+
+QUERIES = [list(combo) for combo in itertools.product(*SELECTOR_VALUES)]
+EXTRA_QUERIES = [
+    "ovalado, rugoso falcado", "  Liso,,Recto ", "", ["Rugoso", "RUGOSO"], ["caparazon rugoso extra"],
+    ["ovalado dactilo"], ["a"], ["zz"], [],
+]
+
+# --- Pruebas ---
+def test_selector_grid_covers_all_combinations():
+    assert len(QUERIES) == 192
+
+@pytest.mark.parametrize("engine_name", ENGINES)
+def test_engines_match_baseline(seeded_db, engine_name):
+    species_rows = seeded_db.get_all_species()
+    engine = ExpertEngine(engine_name)
+    for query in QUERIES + EXTRA_QUERIES:
+        expected = _comparable(baseline_identify(species_rows, query))
+        for top_k in (None, 1, 5, 50):
+            results = engine.identify_by_features(query, top_k=top_k)
+            assert _comparable(results) == (expected if top_k is None else expected[:top_k]), (query, top_k)
+
+def test_engines_follow_species_changes(seeded_db):
+    engine = ExpertEngine()
+    before = engine.identify_by_features(["falcado"])
+    seeded_db.add_species("Nuevo", "falcatus", "Nuevo", "", "falcado, rugoso")
+    after = engine.identify_by_features(["falcado"])
+    assert len(after) == len(before) + 1
+    assert _comparable(after) == _comparable(baseline_identify(seeded_db.get_all_species(), ["falcado"]))
+
+def test_concurrent_reloads_keep_rules_consistent(seeded_db):
+    engine = ExpertEngine("vectorized")
+    engine.ensure_rules()
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(20):
+                seeded_db._mark_species_changed() # Fuerza una recompilación en cada vuelta
+                engine.identify_by_features(["rugoso", "falcado"])
+                assert len(engine.rules) == len(engine.rules_by_id) == N_SPECIES
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert not errors
+    assert _comparable(engine.identify_by_features(["rugoso", "falcado"])) == \
+        _comparable(baseline_identify(seeded_db.get_all_species(), ["rugoso", "falcado"]))
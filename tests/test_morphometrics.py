@@ -0,0 +1,45 @@
+""" ************************** 
+    ***  MORPHOMETRICS TEST  *** 
+    ************************** """
+# Comprueba que la superficie solo llega al motor experto cuando la medida es fiable.
+
+# --- Importaciones ---
+import glob
+import os
+
+import pytest
+
+from src.utils import morphometrics
+from src.utils.image_helper import ImageHelper
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUNDLED_PHOTOS = sorted(glob.glob(os.path.join(ROOT, "assets", "species_images", "*.png")) +
+                        glob.glob(os.path.join(ROOT, "Grupo1", "assets", "cangrejos", "*")))
+
+def texture(roughness, coherence):
+    return {"roughness": roughness, "coherence": coherence}
+
+# --- Pruebas ---
+@pytest.mark.parametrize("measure, expected", [
+    (texture(0.01, 0.9), ["ovalado", "liso"]),
+    (texture(0.10, 0.9), ["ovalado", "estriado"]),
+    (texture(0.10, 0.2), ["ovalado", "rugoso"]),
+    (texture(0.045, 0.9), ["ovalado"]), # Rugosidad en la banda de indecisión
+    (texture(0.10, 0.5), ["ovalado"]), # Coherencia en la banda de indecisión
+])
+def test_surface_only_when_clearly_past_threshold(measure, expected):
+    assert morphometrics.traits_from_descriptors(0.5, measure) == expected
+
+def test_no_surface_without_valid_segmentation():
+    assert morphometrics.traits_from_descriptors(1.2, texture(0.10, 0.9), segmented=False) == ["subcilindrico"]
+    assert morphometrics.fills_frame((0, 0, 300, 200), (200, 300))
+    assert not morphometrics.fills_frame((20, 10, 200, 150), (200, 300))
+
+@pytest.mark.parametrize("path", BUNDLED_PHOTOS, ids=os.path.basename)
+def test_bundled_photos_only_report_reliable_surfaces(path):
+    for max_side in (None, 256):
+        analysis = ImageHelper._analyze(path, None, max_side)
+        measures = analysis["morphometrics"]
+        assert "surface" in measures # La medida se conserva siempre
+        if not (measures["segmented"] and measures["surface_clear"]):
+            assert analysis["traits"] == [analysis["detected_shape"]]
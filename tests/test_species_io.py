@@ -0,0 +1,57 @@
+""" ************************** 
+    ***   SPECIES IO TEST    *** 
+    ************************** """
+# Comprueba que la exportación del catálogo respeta los dos formatos de key_features de la base.
+
+# --- Importaciones ---
+import csv
+import json
+import os
+import shutil
+
+import pytest
+
+from src.utils import species_io
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- Pruebas ---
+@pytest.mark.parametrize("fmt", ["csv", "json", "jsonl"])
+def test_export_reads_json_and_comma_features(temp_db, tmp_path, fmt):
+    temp_db.add_species("Emerita", "analoga", "Cangrejo topo", "", '["liso", "caparazon rugoso"]')
+    temp_db.add_species("Hippa", "pacifica", "Muy muy", "", "ovalado, falcado")
+    path = tmp_path / f"catalogo.{fmt}"
+    assert species_io.export_catalogue(str(path), temp_db) == 2
+
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            features = [row["key_features"] for row in csv.DictReader(f)]
+            assert features == ["liso, caparazon rugoso", "ovalado, falcado"]
+            return
+        records = json.load(f) if fmt == "json" else [json.loads(line) for line in f]
+    assert [r["key_features"] for r in records] == [["liso", "caparazon rugoso"], ["ovalado", "falcado"]]
+
+def test_features_text_accepts_json_arrays():
+    assert species_io._features_text('["Liso", "Caparazon rugoso"]') == "liso, caparazon rugoso"
+    assert species_io._features_text("ovalado; falcado,recto") == "ovalado, falcado, recto"
+    assert species_io._features_text(["A", " ", "b"]) == "a, b"
+
+def test_import_rejects_path_traversal_in_names(temp_db, tmp_path):
+    shutil.copyfile(os.path.join(ROOT, "assets", "species_images", "hippa_pacifica.png"), tmp_path / "foto.png")
+    records = [
+        {"genus": "../../evil", "species": "x", "key_features": "liso", "image_path": "foto.png"},
+        {"genus": "Emerita", "species": "a\\..\\b", "key_features": "liso", "image_path": "foto.png"},
+        {"genus": "Emerita", "species": "cf. analoga", "key_features": "liso", "image_path": "foto.png"},
+    ]
+    catalogue = tmp_path / "catalogo.json"
+    catalogue.write_text(json.dumps(records), encoding="utf-8")
+
+    report = species_io.import_catalogue(str(catalogue), temp_db)
+    assert report["inserted"] == 1 and len(report["errors"]) == 2
+    assert os.listdir(tmp_path / species_io.IMAGES_DIR) == ["emerita_cf_analoga.png"]
+    assert not (tmp_path / "evil_x.png").exists()
+
+def test_image_filename_is_a_strict_slug():
+    assert species_io.image_filename("../../evil", "x") == "evil_x.png"
+    with pytest.raises(ValueError):
+        species_io.image_filename("..", "/")